@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Render modes in the order the camera path visits them, as (faces, drawing backend); the
+# viewer starts in the first one
+MODES = (("wireframe", "numpy"), ("solid", "numpy"), ("solid", "pygame"), ("wireframe", "pygame"))
+FRAMES_PER_MODE = 120
+
+# Frames after every mode switch left out of the statistics, and the number of frames
+# spent zooming in, then out, while the model orbits
+WARMUP_FRAMES = 5
+ZOOM_FRAMES = 15
+
+# Longest a model's benchmark may run before it is stopped and reported as failed
+TIMEOUT_S = 600
+
+# The scripted camera path as one (mode name, pygame events) entry per frame: optionally turn
+# automatic level of detail off, then switch modes, each starting from the reset view with a
+# fresh orbit so every mode replays the same views, and zoom back and forth
+def camera_path(frames_per_mode, auto_lod=False):
+    import pygame
+    def key(name):
+        return pygame.event.Event(pygame.KEYDOWN, key=name, mod=0, unicode='')
+    def wheel(button):
+        return pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=button, pos=(0, 0))
+    path = []
+    previous = MODES[0]
+    for mode in MODES:
+        for frame in range(frames_per_mode):
+            events = []
+            if frame == 0:
+                if mode == MODES[0] and not auto_lod:
+                    events.append(key(pygame.K_o))
+                if mode[0] != previous[0]:
+                    events.append(key(pygame.K_SPACE))
+                if mode[1] != previous[1]:
+                    events.append(key(pygame.K_f))
+                events += [key(pygame.K_r), key(pygame.K_a), key(pygame.K_a)]
+            events.append(wheel(4 if frame // ZOOM_FRAMES % 2 == 0 else 5))
+            path.append(("/".join(mode), events))
+        previous = mode
+    return path
+
+# Peak resident memory of this process and its finished children, in MB (None where unsupported)
+def peak_memory_mb():
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+# Frame latency statistics in milliseconds
+def latency_stats(frame_times):
+    times = np.array(frame_times) * 1000
+    if not len(times):
+        return {"frames": 0}
+    p50, p95, p99 = np.percentile(times, (50, 95, 99))
+    return {"frames": len(times), "mean_ms": float(times.mean()), "p50_ms": float(p50), "p95_ms": float(p95),
+            "p99_ms": float(p99), "max_ms": float(times.max()), "fps": float(1000 / times.mean())}
+
+# Run the viewer on one model in this process, replaying the camera path; returns the model's
+# results, or raises RuntimeError when the model can't be loaded
+def run_model(path, frames_per_mode, auto_lod=False):
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import pygame
+    import main
+    import profiler
+
+    script = camera_path(frames_per_mode, auto_lod)
+    state = {"frame": 0, "delivered": -1, "load_s": None, "failed": False}
+    frame_times = {mode: [] for mode, _ in script}
+    started = time.perf_counter()
+
+    # Hand each frame its scripted events once, then quit at the end of the path
+    get_events = pygame.event.get
+    def scripted_events(*args, **kwargs):
+        get_events(*args, **kwargs)
+        frame = state["frame"]
+        if frame >= len(script) or state["failed"]:
+            return [pygame.event.Event(pygame.QUIT)]
+        if state["delivered"] == frame:
+            return []
+        state["delivered"] = frame
+        return script[frame][1]
+    pygame.event.get = scripted_events
+
+    # The viewer's profiler sees the stage timings of every frame
+    record = profiler.Profiler.record
+    def timed_record(self, stage_times, reused=False):
+        record(self, stage_times, reused)
+        if state["load_s"] is None:
+            state["load_s"] = time.perf_counter() - started
+        frame = state["frame"]
+        if frame < len(script) and not reused and frame % frames_per_mode >= WARMUP_FRAMES:
+            frame_times[script[frame][0]].append(sum(stage_times.values()))
+        state["frame"] += 1
+    profiler.Profiler.record = timed_record
+
+    # The viewer shows the default cube instead of a model it fails to load; don't time that
+    create_model = main.create_model
+    def checked_create_model(obj_path, mesh, materials):
+        model = create_model(obj_path, mesh, materials)
+        state["failed"] = model["path"] is None
+        return model
+    main.create_model = checked_create_model
+
+    main.main([path, '--mode', MODES[0][0], '--backend', MODES[0][1]])
+    if state["failed"]:
+        raise RuntimeError(f"'{path}' could not be loaded")
+    return {"model": path, "load_s": state["load_s"], "peak_mb": peak_memory_mb(),
+            "modes": {mode: latency_stats(times) for mode, times in frame_times.items()}}
+
+# Benchmark every model in its own process, so load times and peak memory don't carry over
+def run_benchmark(paths, frames_per_mode, auto_lod=False, cold=False, adaptive=False, timeout=TIMEOUT_S):
+    results = []
+    for path in paths:
+        env = dict(os.environ)
+        if not adaptive:
+            env['OBJ_VIEWER_TARGET_FPS'] = '0'
+        with tempfile.TemporaryDirectory() as scratch:
+            if cold:
+                env['OBJ_VIEWER_CACHE_DIR'] = os.path.join(scratch, 'cache')
+            result_path = os.path.join(scratch, 'result.json')
+            command = [sys.executable, os.path.abspath(__file__), os.path.abspath(path),
+                       '--frames', str(frames_per_mode), '--result', result_path] + (['--lod'] if auto_lod else [])
+            try:
+                completed = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                print(f"Benchmark failed for '{path}' (timed out after {timeout:.0f} s)")
+                continue
+            if completed.returncode != 0 or not os.path.exists(result_path):
+                print(f"Benchmark failed for '{path}' (exit code {completed.returncode})")
+                continue
+            with open(result_path) as f:
+                results.append(json.load(f))
+        print_result(results[-1])
+    return results
+
+def print_result(result):
+    peak = f"{result['peak_mb']:.0f} MB" if result['peak_mb'] is not None else "n/a"
+    print(f"\n{result['model']}: loaded and first frame drawn in {result['load_s']:.2f} s, peak memory {peak}")
+    print(f"  {'mode':<18}{'frames':>7}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'fps':>8}")
+    for mode, stats in result['modes'].items():
+        if stats['frames']:
+            print(f"  {mode:<18}{stats['frames']:>7}{stats['mean_ms']:>9.2f}{stats['p50_ms']:>9.2f}"
+                  f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['max_ms']:>9.2f}{stats['fps']:>8.1f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a scripted camera path headlessly and report frame times")
+    parser.add_argument('paths', nargs='+', help="OBJ files to benchmark")
+    parser.add_argument('--frames', type=int, default=FRAMES_PER_MODE, help="Frames rendered in every mode")
+    parser.add_argument('--lod', action='store_true', help="Keep automatic level of detail on")
+    parser.add_argument('--adaptive', action='store_true', help="Keep adaptive quality on")
+    parser.add_argument('--cold', action='store_true', help="Start from an empty mesh cache")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT_S, help="Seconds a model may run before it fails")
+    parser.add_argument('--json', help="Write all results to this JSON file")
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.result:
+        # Worker run for a single model
+        try:
+            result = run_model(args.paths[0], args.frames, args.lod)
+        except RuntimeError as e:
+            sys.exit(f"Benchmark failed: {e}")
+        with open(args.result, 'w') as f:
+            json.dump(result, f)
+    else:
+        results = run_benchmark(args.paths, args.frames, args.lod, args.cold, args.adaptive, args.timeout)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
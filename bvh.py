@@ -0,0 +1,205 @@
+import numpy as np
+import mesh_cache
+
+# Faces per leaf; leaves hold consecutive faces in Morton order
+LEAF_SIZE = 8
+
+# Spread the low 10 bits of each value so that two zero bits separate consecutive ones
+def _part1by2(values):
+    values = values.astype(np.int64) & 0x3FF
+    values = (values | (values << 16)) & 0x030000FF
+    values = (values | (values << 8)) & 0x0300F00F
+    values = (values | (values << 4)) & 0x030C30C3
+    values = (values | (values << 2)) & 0x09249249
+    return values
+
+# 30-bit Morton codes of (N,3) points inside the given bounds
+def morton_codes(points, low, high):
+    cells = (points - low) / np.maximum(high - low, 1e-12) * 1023
+    cells = np.clip(np.nan_to_num(cells), 0, 1023)
+    return (_part1by2(cells[:, 0]) << 2) | (_part1by2(cells[:, 1]) << 1) | _part1by2(cells[:, 2])
+
+# Per-face (F,3) bounding boxes of CSR faces; faces without valid corners get empty (inf, -inf) boxes
+def face_bounds(vertices, indices, offsets):
+    sizes = np.diff(offsets)
+    low = np.full((len(sizes), 3), np.inf)
+    high = np.full((len(sizes), 3), -np.inf)
+    non_empty = sizes > 0
+    if non_empty.any():
+        valid = (indices >= 0) & (indices < len(vertices))
+        corners = np.full((len(indices), 3), np.nan)
+        corners[valid] = vertices[indices[valid]]
+        starts = offsets[:-1][non_empty]
+        low[non_empty] = np.fmin.reduceat(corners, starts, axis=0)
+        high[non_empty] = np.fmax.reduceat(corners, starts, axis=0)
+        low[np.isnan(low)] = np.inf
+        high[np.isnan(high)] = -np.inf
+    return low, high
+
+class BVH:
+    # Complete binary tree in heap order (children of node i are 2i+1 and 2i+2) over faces
+    # sorted by the Morton code of their centroid, so every node covers a contiguous run of
+    # face_order; low/high are (N,3) node bounds, empty nodes have inverted bounds
+    def __init__(self, face_order, low, high, leaf_size=LEAF_SIZE):
+        self.face_order = np.asarray(face_order, dtype=np.int64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.leaf_size = leaf_size
+        self.depth = int(np.log2(len(self.low) + 1)) - 1
+
+    # Build the tree for a mesh's faces in one vectorized pass per level
+    @classmethod
+    def build(cls, vertices, indices, offsets, leaf_size=LEAF_SIZE):
+        face_low, face_high = face_bounds(vertices, indices, offsets)
+        centroids = (face_low + face_high) / 2
+        finite = np.isfinite(centroids).all(axis=1)
+        bounds_low = centroids[finite].min(axis=0) if finite.any() else np.zeros(3)
+        bounds_high = centroids[finite].max(axis=0) if finite.any() else np.zeros(3)
+        face_order = np.argsort(morton_codes(centroids, bounds_low, bounds_high), kind='stable')
+
+        leaf_count = max(-(-len(face_order) // leaf_size), 1)
+        depth = int(np.ceil(np.log2(leaf_count)))
+        first_leaf = (1 << depth) - 1
+        low = np.full((2 * first_leaf + 1, 3), np.inf)
+        high = np.full((2 * first_leaf + 1, 3), -np.inf)
+        if len(face_order):
+            starts = np.arange(0, len(face_order), leaf_size)
+            leaves = first_leaf + np.arange(len(starts))
+            low[leaves] = np.minimum.reduceat(face_low[face_order], starts, axis=0)
+            high[leaves] = np.maximum.reduceat(face_high[face_order], starts, axis=0)
+        for level in range(depth - 1, -1, -1):
+            nodes = np.arange((1 << level) - 1, (1 << (level + 1)) - 1)
+            low[nodes] = np.minimum(low[2 * nodes + 1], low[2 * nodes + 2])
+            high[nodes] = np.maximum(high[2 * nodes + 1], high[2 * nodes + 2])
+        return cls(face_order, low, high, leaf_size)
+
+    @classmethod
+    def from_arrays(cls, arrays, leaf_size):
+        return cls(arrays['face_order'], arrays['low'], arrays['high'], leaf_size)
+
+    def arrays(self):
+        return {'face_order': self.face_order, 'low': self.low, 'high': self.high}
+
+    # Apply the viewer's model normalization, (vertex - center) * scale, to the node bounds
+    def transform(self, center, scale):
+        self.low = (self.low - center) * scale
+        self.high = (self.high - center) * scale
+
+    # Contiguous runs of face_order covered by nodes on one level, as (start, end) arrays
+    def _face_ranges(self, nodes, level):
+        span = 1 << (self.depth - level)
+        first = (nodes + 1) * span - (1 << self.depth)
+        count = len(self.face_order)
+        return np.minimum(first * self.leaf_size, count), np.minimum((first + span) * self.leaf_size, count)
+
+    # Walk the tree one level at a time; visit(nodes) returns which nodes are accepted whole
+    # and which to descend into. Returns the (start, end) face_order runs of accepted
+    # subtrees and of the leaves reached
+    def _collect(self, visit):
+        starts, ends = [], []
+        nodes = np.zeros(1, dtype=np.int64)
+        for level in range(self.depth + 1):
+            nodes = nodes[self.low[nodes, 0] <= self.high[nodes, 0]]
+            if not len(nodes):
+                break
+            accepted, descend = visit(nodes)
+            if level == self.depth:
+                accepted = accepted | descend
+            ranges = self._face_ranges(nodes[accepted], level)
+            starts.append(ranges[0])
+            ends.append(ranges[1])
+            nodes = nodes[descend & ~accepted]
+            nodes = np.stack((2 * nodes + 1, 2 * nodes + 2), axis=1).ravel()
+        if not starts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(starts), np.concatenate(ends)
+
+    # (F,) mask of faces whose bounds may intersect the convex volume n . p + d >= 0 of
+    # (P,4) planes; subtrees fully inside or fully outside are settled without descending
+    def frustum_faces(self, planes):
+        normals, distances = planes[:, :3], planes[:, 3]
+        def visit(nodes):
+            center = (self.low[nodes] + self.high[nodes]) / 2
+            extent = (self.high[nodes] - self.low[nodes]) / 2
+            distance = center @ normals.T + distances
+            radius = extent @ np.abs(normals).T
+            outside = (distance + radius < 0).any(axis=1)
+            inside = (distance - radius >= 0).all(axis=1)
+            return inside, ~outside & ~inside
+        starts, ends = self._collect(visit)
+        marks = np.zeros(len(self.face_order) + 1, dtype=np.int64)
+        np.add.at(marks, starts, 1)
+        np.add.at(marks, ends, -1)
+        mask = np.zeros(len(self.face_order), dtype=bool)
+        mask[self.face_order] = np.cumsum(marks[:-1]) > 0
+        return mask
+
+    # Sorted ids of the faces whose bounds the ray origin + t * direction (t >= 0) passes through
+    def ray_faces(self, origin, direction):
+        with np.errstate(divide='ignore'):
+            inverse = 1.0 / direction
+        def visit(nodes):
+            with np.errstate(invalid='ignore'):
+                t_low = (self.low[nodes] - origin) * inverse
+                t_high = (self.high[nodes] - origin) * inverse
+            # A zero direction component gives nan when the origin lies on the slab
+            t_near = np.nan_to_num(np.minimum(t_low, t_high), nan=-np.inf).max(axis=1)
+            t_far = np.nan_to_num(np.maximum(t_low, t_high), nan=np.inf).min(axis=1)
+            hit = (t_near <= t_far) & (t_far >= 0)
+            return np.zeros(len(nodes), dtype=bool), hit
+        starts, ends = self._collect(visit)
+        return np.sort(self.face_order[_expand_ranges(starts, ends)])
+
+# Concatenated aranges for (start, end) pairs
+def _expand_ranges(starts, ends):
+    lengths = ends - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+# Nearest face hit by a model-space ray, as (face, nearest corner vertex, distance), or None
+def pick(mesh, bvh, origin, direction):
+    corners, triangle_faces = mesh.triangulate()
+    faces = bvh.ray_faces(origin, direction)
+    candidates = _expand_ranges(np.searchsorted(triangle_faces, faces, 'left'),
+                                np.searchsorted(triangle_faces, faces, 'right'))
+    triangles = mesh.indices[corners[candidates]]
+    valid = ((triangles >= 0) & (triangles < len(mesh.vertices))).all(axis=1)
+    candidates, triangles = candidates[valid], triangles[valid]
+    if not len(candidates):
+        return None
+
+    # Moller-Trumbore intersection against every candidate triangle at once
+    a, b, c = (mesh.vertices[triangles[:, i]] for i in range(3))
+    edge1, edge2 = b - a, c - a
+    p = np.cross(direction, edge2)
+    determinant = np.einsum('ij,ij->i', edge1, p)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1.0 / determinant
+        s = origin - a
+        u = np.einsum('ij,ij->i', s, p) * inverse
+        q = np.cross(s, edge1)
+        v = (q @ direction) * inverse
+        t = np.einsum('ij,ij->i', edge2, q) * inverse
+        hit = (np.abs(determinant) > 1e-12) & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    if not hit.any():
+        return None
+    nearest = np.flatnonzero(hit)[np.argmin(t[hit])]
+    face = int(triangle_faces[candidates[nearest]])
+    point = origin + direction * t[nearest]
+    face_vertices = mesh.face(face)
+    face_vertices = face_vertices[(face_vertices >= 0) & (face_vertices < len(mesh.vertices))]
+    vertex = int(face_vertices[np.argmin(np.linalg.norm(mesh.vertices[face_vertices] - point, axis=1))])
+    return face, vertex, float(t[nearest])
+
+# Load the cached BVH of a source file's mesh, building and caching it on a miss
+def load_bvh(source_path, mesh, leaf_size=LEAF_SIZE):
+    cached = mesh_cache.load_arrays(source_path, 'bvh')
+    if cached is not None:
+        arrays, metadata = cached
+        if metadata.get('leaf_size') == leaf_size and len(arrays['face_order']) == mesh.face_count:
+            return BVH.from_arrays(arrays, leaf_size)
+    bvh = BVH.build(mesh.vertices, mesh.indices, mesh.offsets, leaf_size)
+    try:
+        mesh_cache.store_arrays(source_path, 'bvh', bvh.arrays(), {'leaf_size': leaf_size})
+    except OSError as e:
+        print(f"Could not cache the BVH of '{source_path}': {e}")
+    return bvh
@@ -0,0 +1,86 @@
+import numpy as np
+from projection import FOCAL_LENGTH, NEAR_PLANE
+
+# Faces whose normal, after the view transform, points toward the camera at (0, 0, -camera_distance);
+# faces without a normal (degenerate or fewer than three corners) are never culled
+def front_facing(face_normals, face_centroids, matrix, camera_distance):
+    view_normals = face_normals @ matrix.T
+    view_centroids = face_centroids @ matrix.T
+    view_centroids[:, 2] += camera_distance
+    facing = np.einsum('ij,ij->i', view_normals, view_centroids)
+    return (facing < 0) | ~np.any(face_normals, axis=1)
+
+# The viewing volume (near plane and the four viewport edges) as (5,4) planes n . p + d >= 0
+# in model space, where view space is matrix @ p
+def frustum_planes(matrix, translate_x, translate_y, camera_distance, screen_width, screen_height):
+    center_x = screen_width // 2 + translate_x
+    center_y = screen_height // 2 + translate_y
+    # In view space each plane is n . p + n_z * camera_distance >= 0, with depth z + camera_distance
+    normals = np.array([
+        [0.0, 0.0, 1.0],
+        [FOCAL_LENGTH, 0.0, center_x],
+        [-FOCAL_LENGTH, 0.0, screen_width - center_x],
+        [0.0, FOCAL_LENGTH, center_y],
+        [0.0, -FOCAL_LENGTH, screen_height - center_y]
+    ])
+    distances = normals[:, 2] * camera_distance
+    distances[0] -= NEAR_PLANE
+    return np.column_stack((normals @ matrix, distances))
+
+# Primitives given as (N,K,2) screen points that are not entirely beyond one viewport edge
+def inside_viewport(points, width, height):
+    low = points.min(axis=1)
+    high = points.max(axis=1)
+    return (high[:, 0] >= 0) & (high[:, 1] >= 0) & (low[:, 0] < width) & (low[:, 1] < height)
+
+# Move the endpoints of (N,3) view-space segments that lie behind z = near onto the plane;
+# every segment must be at least partly in front of it
+def clip_segments_near(starts, ends, near):
+    starts, ends = starts.copy(), ends.copy()
+    for moved, other in ((starts, ends), (ends, starts)):
+        behind = moved[:, 2] < near
+        t = (near - moved[behind, 2]) / (other[behind, 2] - moved[behind, 2])
+        moved[behind] += (other[behind] - moved[behind]) * t[:, None]
+    return starts, ends
+
+# Clip (T,3) triangles over (N,3) view-space points to z >= near. Triangles with one corner
+# behind become two, with two behind become one, and fully hidden ones are dropped.
+# Returns the (M,3) new points (numbered from N), the triangles, each one's source triangle
+# and its (T',3,2) UVs interpolated to the new corners
+def clip_triangles_near(view_points, triangles, uvs, near):
+    behind = view_points[triangles, 2] < near
+    behind_count = behind.sum(axis=1)
+    kept = np.flatnonzero(behind_count == 0)
+    new_points = [np.zeros((0, 3))]
+    clipped_triangles, sources, clipped_uvs = [triangles[kept]], [kept], [uvs[kept]]
+    next_index = len(view_points)
+    for count in (1, 2):
+        source = np.flatnonzero(behind_count == count)
+        if not len(source):
+            continue
+        # Rotate each triangle so its odd corner out comes first, which keeps the winding
+        lone = behind[source] if count == 1 else ~behind[source]
+        order = (np.argmax(lone, axis=1)[:, None] + np.arange(3)) % 3
+        corners = np.take_along_axis(triangles[source], order, axis=1)
+        corner_uvs = np.take_along_axis(uvs[source], order[:, :, None], axis=1)
+        a, b, c = (view_points[corners[:, i]] for i in range(3))
+        t_ab = ((near - a[:, 2]) / (b[:, 2] - a[:, 2]))[:, None]
+        t_ac = ((near - a[:, 2]) / (c[:, 2] - a[:, 2]))[:, None]
+        new_points += [a + (b - a) * t_ab, a + (c - a) * t_ac]
+        uv_ab = corner_uvs[:, 0] + (corner_uvs[:, 1] - corner_uvs[:, 0]) * t_ab
+        uv_ac = corner_uvs[:, 0] + (corner_uvs[:, 2] - corner_uvs[:, 0]) * t_ac
+        ab = next_index + np.arange(len(source))
+        ac = ab + len(source)
+        next_index += 2 * len(source)
+        if count == 1:
+            # The visible part is the quad AB, B, C, AC
+            pieces = [((ab, corners[:, 1], corners[:, 2]), (uv_ab, corner_uvs[:, 1], corner_uvs[:, 2])),
+                      ((ab, corners[:, 2], ac), (uv_ab, corner_uvs[:, 2], uv_ac))]
+        else:
+            pieces = [((corners[:, 0], ab, ac), (corner_uvs[:, 0], uv_ab, uv_ac))]
+        for piece_corners, piece_uvs in pieces:
+            clipped_triangles.append(np.stack(piece_corners, axis=1))
+            clipped_uvs.append(np.stack(piece_uvs, axis=1))
+            sources.append(source)
+    return (np.concatenate(new_points), np.concatenate(clipped_triangles),
+            np.concatenate(sources), np.concatenate(clipped_uvs))
@@ -0,0 +1,41 @@
+import pygame
+from collections import OrderedDict
+
+# Rendered text surfaces kept around, least recently used dropped first
+TEXT_CACHE_SIZE = 256
+LINE_SPACING = 30
+
+class Hud:
+    # Text overlay drawn from a list of lines; the font is created once, every distinct line is
+    # rendered once while it stays in the cache, and the composed overlay is reused until a line changes
+    def __init__(self, color, font_size=24, position=(10, 10), cache_size=TEXT_CACHE_SIZE):
+        self.font = pygame.font.Font(None, font_size)
+        self.color = color
+        self.position = position
+        self.cache_size = cache_size
+        self.texts = OrderedDict()
+        self.lines = None
+        self.overlay = None
+
+    # Surface for one line of text
+    def text(self, line):
+        surface = self.texts.get(line)
+        if surface is None:
+            surface = self.font.render(line, True, self.color)
+            self.texts[line] = surface
+            if len(self.texts) > self.cache_size:
+                self.texts.popitem(last=False)
+        else:
+            self.texts.move_to_end(line)
+        return surface
+
+    def draw(self, screen, lines):
+        if lines != self.lines:
+            surfaces = [self.text(line) for line in lines]
+            width = max((surface.get_width() for surface in surfaces), default=0)
+            height = (len(surfaces) - 1) * LINE_SPACING + surfaces[-1].get_height() if surfaces else 0
+            self.overlay = pygame.Surface((max(width, 1), max(height, 1)), pygame.SRCALPHA)
+            for row, surface in enumerate(surfaces):
+                self.overlay.blit(surface, (0, row * LINE_SPACING))
+            self.lines = list(lines)
+        screen.blit(self.overlay, self.position)
@@ -0,0 +1,91 @@
+import numpy as np
+from mesh import Mesh
+
+# Each level keeps at most LOD_REDUCTION of the previous level's triangles, down to MIN_LOD_FACES
+MIN_LOD_FACES = 64
+LOD_REDUCTION = 0.5
+MAX_GRID_RESOLUTION = 1024
+
+# Level selection: faces should cover at least PIXELS_PER_FACE pixels on screen (MOTION_FACTOR
+# times that while the view is moving), and frames should stay under TARGET_FRAME_TIME seconds
+TARGET_FRAME_TIME = 1 / 30
+PIXELS_PER_FACE = 8
+MOTION_FACTOR = 4
+
+# Snap (N,3) points to a grid with `resolution` cells along the longest axis; returns every
+# point's cluster id and the first point of each cluster
+def cluster_vertices(points, resolution):
+    low = points.min(axis=0)
+    size = max(float((points.max(axis=0) - low).max()), 1e-12)
+    cells = np.clip(((points - low) / size * resolution).astype(np.int64), 0, resolution - 1)
+    keys = (cells[:, 0] * resolution + cells[:, 1]) * resolution + cells[:, 2]
+    _, first, cluster = np.unique(keys, return_index=True, return_inverse=True)
+    return cluster.reshape(-1), first
+
+# Move (T,3) triangle corners onto their clusters, dropping triangles that collapse or
+# duplicate another one; returns the kept triangle ids and their cluster corners
+def collapse_triangles(triangles, cluster):
+    remapped = cluster[triangles]
+    a, b, c = remapped[:, 0], remapped[:, 1], remapped[:, 2]
+    kept = np.flatnonzero((a != b) & (b != c) & (a != c))
+    ordered = np.sort(remapped[kept], axis=1).astype(np.int64)
+    if len(cluster) < (1 << 21):
+        keys = (ordered[:, 0] << 42) | (ordered[:, 1] << 21) | ordered[:, 2]
+        _, first = np.unique(keys, return_index=True)
+    else:
+        _, first = np.unique(ordered, axis=0, return_index=True)
+    kept = kept[np.sort(first)]
+    return kept, remapped[kept]
+
+# Vertex-clustering simplification on ever coarser grids; yields (kept triangle ids,
+# (K,3) cluster corners, cluster ids, first point per cluster) for each accepted level
+def decimation_levels(points, triangles, min_faces=MIN_LOD_FACES):
+    previous = len(triangles)
+    resolution = MAX_GRID_RESOLUTION
+    while resolution >= 2 and previous > min_faces and len(points):
+        cluster, first = cluster_vertices(points, resolution)
+        kept, remapped = collapse_triangles(triangles, cluster)
+        if 0 < len(kept) <= previous * LOD_REDUCTION:
+            yield kept, remapped, cluster, first
+            previous = len(kept)
+        resolution //= 2
+
+# Simplified copies of a mesh, finest first, as (triangle mesh, source face of every triangle);
+# each cluster becomes one vertex at the mean of its members
+def build_lods(mesh, min_faces=MIN_LOD_FACES):
+    corners, triangle_faces = mesh.triangulate()
+    triangles = mesh.indices[corners]
+    valid = np.all((triangles >= 0) & (triangles < len(mesh.vertices)), axis=1)
+    corners, triangle_faces, triangles = corners[valid], triangle_faces[valid], triangles[valid]
+    for kept, remapped, cluster, _ in decimation_levels(mesh.vertices, triangles, min_faces):
+        counts = np.bincount(cluster)
+        centers = np.stack([np.bincount(cluster, mesh.vertices[:, axis]) for axis in range(3)], axis=1)
+        used, compact = np.unique(remapped.ravel(), return_inverse=True)
+        lod_corners = corners[kept].ravel()
+        lod = Mesh(centers[used] / counts[used, None], compact, np.arange(0, len(compact) + 1, 3),
+                   mesh.uv_indices[lod_corners], mesh.uvs, mesh.material_ids[triangle_faces[kept]],
+                   mesh.material_names, mesh.normal_indices[lod_corners], mesh.normals)
+        yield lod, triangle_faces[kept]
+
+# Simplified versions of an indexed triangle list, finest first; every level indexes the
+# original vertex buffer, using the first vertex of each cluster
+def build_index_lods(positions, indices, min_faces=MIN_LOD_FACES):
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    for _, remapped, _, first in decimation_levels(positions, triangles, min_faces):
+        yield first[remapped].astype(np.uint32).ravel()
+
+# Level to draw for (L,) face counts, finest first: the finest whose faces stay above the
+# on-screen size limit, coarsened while frames run over target_frame_time and refined again
+# once the finer level is expected to fit
+def select_level(face_counts, screen_radius, frame_time, current, moving=False,
+                 target_frame_time=TARGET_FRAME_TIME):
+    pixels_per_face = PIXELS_PER_FACE * (MOTION_FACTOR if moving else 1)
+    budget = np.pi * screen_radius ** 2 / pixels_per_face
+    fitting = [level for level, count in enumerate(face_counts) if count <= budget]
+    size_level = fitting[0] if fitting else len(face_counts) - 1
+    time_level = current
+    if frame_time > target_frame_time:
+        time_level = current + 1
+    elif 0 < current < len(face_counts) and frame_time * face_counts[current - 1] / max(face_counts[current], 1) < target_frame_time:
+        time_level = current - 1
+    return int(np.clip(max(size_level, time_level), 0, len(face_counts) - 1))
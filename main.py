@@ -1,14 +1,26 @@
-import pygame
-import math
-import numpy as np
+import argparse
+import json
 import os
+import sys
+import threading
+import numpy as np
+import pygame
 from datetime import datetime
-
-# Initialize pygame
-pygame.init()
-screen_width, screen_height = 800, 600
-screen = pygame.display.set_mode((screen_width, screen_height))
-pygame.display.set_caption("OBJ File Viewer")
+from mesh import Mesh, classify_edges
+from parallel_loader import load_meshes
+from bvh import BVH, load_bvh, pick
+from culling import clip_segments_near, clip_triangles_near, front_facing, frustum_planes, inside_viewport
+from hud import Hud
+from lod import build_lods, select_level
+from model_library import MEMORY_BUDGET_MB, ModelLibrary
+from profiler import TRACE_PATH, Profiler
+from projection import (FOCAL_LENGTH, NEAR_PLANE, project_points, project_view_points, rotation_matrix, screen_ray,
+                        transform_points, view_matrix)
+from raster import Framebuffer, draw_lines, draw_points, draw_triangles
+from scheduler import (QUALITY_COARSEST_LOD, QUALITY_NO_NORMALS, QUALITY_NO_VERTICES, QUALITY_POINTS, QUALITY_WIREFRAME,
+                       FrameScheduler)
+from texture import MAX_TEXTURE_SIZE, Texture, TextureSet
+from texture_cache import shared_textures
 
 # Colors
 BLACK = (0, 0, 0)
@@ -23,13 +35,19 @@ GRAY = (100, 100, 100)
 DARK_BLUE = (0, 0, 100)
 COLORS = [RED, GREEN, BLUE, WHITE, YELLOW, CYAN, MAGENTA]
 BG_COLORS = [BLACK, GRAY, DARK_BLUE, (50, 50, 50), (0, 100, 100)]
-edge_color = WHITE
-vertex_color = RED
-bg_color = BLACK
-bg_color_index = 0
 
-# Function to load material file (.mtl)
-def load_mtl(filename):
+# Window size, starting camera and the most models that can be switched between (keys 1-5)
+SCREEN_WIDTH, SCREEN_HEIGHT = 800, 600
+CAMERA_DISTANCE = 5
+MAX_MODELS = 5
+
+# Longest wait for input while the view is idle, so levels of detail finished in the
+# background still show up
+IDLE_WAIT_MS = 250
+
+# Function to load material file (.mtl); textures are requested from the shared texture
+# cache and decode in the background until resolve_textures() or attach_textures()
+def load_mtl(filename, max_texture_size=MAX_TEXTURE_SIZE):
     materials = {}
     current_material = None
     try:
@@ -48,8 +66,7 @@ def load_mtl(filename):
                     texture_dir = os.path.dirname(filename)
                     full_path = os.path.join(texture_dir, texture_path)
                     try:
-                        texture = pygame.image.load(full_path).convert()
-                        materials[current_material]['texture'] = texture
+                        materials[current_material]['texture_key'] = shared_textures.request(full_path, max_texture_size)
                     except Exception as e:
                         print(f"Error loading texture '{full_path}': {e}")
         return materials
@@ -57,99 +74,175 @@ def load_mtl(filename):
         print(f"Error loading .mtl file '{filename}': {e}")
         return {}
 
+# Function to load several OBJ files (with textures) at once in worker processes, yielding
+# (filename, mesh, materials) as each one finishes (mesh is None when loading failed)
+def iter_objs(filenames, max_texture_size=MAX_TEXTURE_SIZE):
+    for filename, mesh, material_libs, elapsed, from_cache in load_meshes(filenames):
+        if mesh is None:
+            yield filename, None, None
+            continue
+        materials = {}
+        for material_lib in material_libs:
+            materials.update(load_mtl(os.path.join(os.path.dirname(filename), material_lib), max_texture_size))
+        throughput = os.path.getsize(filename) / (1024 * 1024) / max(elapsed, 1e-9)
+        source = "cache" if from_cache else "parsed"
+        print(f"Loaded OBJ file '{filename}': {len(mesh.vertices)} vertices, {len(mesh.uvs)} tex coords, {mesh.face_count} faces ({source}, {throughput:.1f} MB/s)")
+        # The textures keep decoding in the background; the materials get them from resolve_textures()
+        yield filename, mesh, materials
+
+# Function to load several OBJ files (with textures) at once; returns {filename: (mesh, materials)}
+def load_objs(filenames, max_texture_size=MAX_TEXTURE_SIZE):
+    loaded = {}
+    for filename, mesh, materials in iter_objs(filenames, max_texture_size):
+        if materials:
+            resolve_textures(materials)
+        loaded[filename] = (mesh, materials)
+    return loaded
+
+# Wait for the textures requested by load_mtl(); materials using the same image share one Texture
+def resolve_textures(materials):
+    textures = {}
+    for material in materials.values():
+        key = material.get('texture_key')
+        if key is None:
+            continue
+        if key not in textures:
+            try:
+                textures[key] = Texture.from_levels(shared_textures.levels(key))
+            except Exception as e:
+                print(f"Error loading texture '{key[0]}': {e}")
+                textures[key] = None
+        material['texture'] = textures[key]
+
+# Attach a model's textures once all of them have decoded; until then it is drawn untextured.
+# Levels of detail built in the meantime are updated too. Runs on the drawing thread and
+# returns whether anything changed
+def attach_textures(model):
+    if model["pending_textures"]:
+        if not all(shared_textures.ready(key) for key in model["pending_textures"]):
+            return False
+        model["pending_textures"] = []
+        resolve_textures(model["materials"])
+        model["textures"] = TextureSet(material_textures(model["mesh"], model["materials"])[0])
+    changed = False
+    for level in model["levels"]:
+        if level["texture_set"] is not model["textures"]:
+            attach_level_textures(level, model["materials"])
+            level["texture_set"] = model["textures"]
+            changed = True
+    return changed
+
+# Give the shared texture cache back a model's textures once it is unloaded
+def release_textures(model):
+    for material in (model["materials"] or {}).values():
+        if material.get('texture_key') is not None:
+            shared_textures.release(material['texture_key'])
+
 # Function to load OBJ file with textures
-def load_obj(filename):
-    vertices = []
-    tex_coords = []
-    faces = []
-    material = None
-    materials = {}
-    try:
-        with open(filename, 'r') as f:
-            for line in f:
-                if line.startswith('mtllib'):
-                    mtl_path = os.path.join(os.path.dirname(filename), line.strip().split()[1])
-                    materials = load_mtl(mtl_path)
-                elif line.startswith('usemtl'):
-                    material = line.strip().split()[1]
-                elif line.startswith('v '):
-                    parts = line.strip().split()
-                    vertex = [float(parts[1]), float(parts[2]), float(parts[3])]
-                    vertices.append(vertex)
-                elif line.startswith('vt '):
-                    parts = line.strip().split()
-                    tex_coord = [float(parts[1]), float(parts[2])]
-                    tex_coords.append(tex_coord)
-                elif line.startswith('f '):
-                    parts = line.strip().split()
-                    face = []
-                    face_tex = []
-                    for part in parts[1:]:
-                        indices = part.split('/')
-                        vertex_index = int(indices[0]) - 1
-                        tex_index = int(indices[1]) - 1 if len(indices) > 1 and indices[1] else -1
-                        face.append(vertex_index)
-                        face_tex.append(tex_index)
-                    faces.append({'vertices': face, 'tex_coords': face_tex, 'material': material})
-        print(f"Loaded OBJ file '{filename}': {len(vertices)} vertices, {len(tex_coords)} tex coords, {len(faces)} faces")
-        return np.array(vertices), tex_coords, faces, materials
-    except Exception as e:
-        print(f"Error loading OBJ file '{filename}': {e}")
-        return None, None, None, None
-
-# Project 3D point to 2D screen
-def project_point(point, angle_x, angle_y, translate_x=0, translate_y=0, scale_factor=1):
-    x = point[0] * scale_factor * math.cos(angle_y) - point[2] * scale_factor * math.sin(angle_y)
-    z = point[0] * scale_factor * math.sin(angle_y) + point[2] * scale_factor * math.cos(angle_y)
-    y = point[1] * scale_factor * math.cos(angle_x) - z * math.sin(angle_x)
-    z = point[1] * scale_factor * math.sin(angle_x) + z * math.cos(angle_x)
-    z += camera_distance
-    if z <= 0:
-        z = 0.001
-    scale = 200 / z
-    x = screen_width // 2 + int(x * scale) + translate_x
-    y = screen_height // 2 + int(y * scale) + translate_y
-    return (x, y), z
-
-# Calculate face normal and centroid
-def calculate_face_normal_and_centroid(vertices, face):
-    v1 = vertices[face[0]]
-    v2 = vertices[face[1]]
-    v3 = vertices[face[2]]
-    vec1 = v2 - v1
-    vec2 = v3 - v1
-    normal = np.cross(vec1, vec2)
-    norm = np.linalg.norm(normal)
-    if norm > 0:
-        normal = normal / norm
-    centroid = np.mean([vertices[i] for i in face], axis=0)
-    return normal, centroid
-
-# Calculate lighting
-def calculate_lighting(normal, light_dir):
-    dot = np.dot(normal, light_dir)
-    intensity = max(0, dot)
-    return intensity
-
-# Draw textured triangle (simplified)
-def draw_textured_triangle(screen, points_2d, tex_coords, texture):
-    if not texture:
-        return
+def load_obj(filename, max_texture_size=MAX_TEXTURE_SIZE):
+    return load_objs([filename], max_texture_size)[filename]
+
+# Calculate lighting for an (F,3) array of view-space normals
+def calculate_lighting(normals, light_dir):
+    return np.clip(normals @ light_dir, 0, 1)
+
+# Flat per-face colors: the palette cycle, or the texture's average color on textured faces
+def compute_face_colors(mesh, materials):
+    face_colors = np.array(COLORS, dtype=np.uint8)[np.arange(mesh.face_count) % len(COLORS)]
+    textured = np.zeros(mesh.face_count, dtype=bool)
+    for material_id, material in enumerate(mesh.material_names):
+        if material in materials and materials[material]['texture']:
+            faces = mesh.material_ids == material_id
+            face_colors[faces] = materials[material]['texture'].average_color()
+            textured |= faces
+    return face_colors, textured
+
+# The mesh's textures in id order, and the texture id of every material (-1 when untextured)
+def material_textures(mesh, materials):
+    textures = []
+    texture_index = {}
+    texture_ids = np.full(len(mesh.material_names) + 1, -1, dtype=np.int64)
+    for material_id, material in enumerate(mesh.material_names):
+        if material in materials and materials[material]['texture']:
+            texture = materials[material]['texture']
+            # Materials sharing a texture share its texels too
+            if id(texture) not in texture_index:
+                texture_index[id(texture)] = len(textures)
+                textures.append(texture)
+            texture_ids[material_id] = texture_index[id(texture)]
+    return textures, texture_ids
+
+# Update a level's colors and texture ids for its model's attached textures: textured faces
+# take their texture's average color, the others keep theirs
+def attach_level_textures(level, materials):
+    mesh = level["mesh"]
+    texture_colors, textured_faces = compute_face_colors(mesh, materials)
+    level["face_colors"] = np.where(textured_faces[:, None], texture_colors, level["face_colors"])
+    level["textured_faces"] = textured_faces
+    level["triangle_textures"] = material_textures(mesh, materials)[1][mesh.material_ids[level["triangle_faces"]]]
+
+# Texture lookup data for (T,3) triangle corners: (T,3,2) UVs and (T,) texture ids
+# (-1 for untextured triangles)
+def compute_triangle_textures(mesh, materials, corners, triangle_faces):
+    _, texture_ids = material_textures(mesh, materials)
+    # Index -1 (no material) lands on the trailing -1 entry
+    texture_ids = texture_ids[mesh.material_ids[triangle_faces]]
+    uv_indices = mesh.uv_indices[corners]
+    uvs = np.zeros(corners.shape + (2,))
+    has_uv = (uv_indices >= 0) & (uv_indices < len(mesh.uvs))
+    uvs[has_uv] = mesh.uvs[uv_indices[has_uv]]
+    return uvs, texture_ids
+
+# Render data for one level of detail of a model: edges, triangles and their colors and texture lookups
+def prepare_level(name, mesh, materials, face_colors, textured_faces, bvh):
+    edges, edge_counts, corner_edges = mesh.edges(return_counts=True, return_inverse=True)
+    valid = np.all((edges >= 0) & (edges < len(mesh.vertices)), axis=1)
+    if not valid.all():
+        print(f"Model '{name}': skipping {np.count_nonzero(~valid)} invalid edges")
+    boundary, non_manifold = classify_edges(edge_counts[valid])
+    mesh.update_face_attributes()
+    corners, triangle_faces = mesh.triangulate()
+    triangles = mesh.indices[corners]
+    valid_triangles = np.all((triangles >= 0) & (triangles < len(mesh.vertices)), axis=1)
+    corners, triangle_faces = corners[valid_triangles], triangle_faces[valid_triangles]
+    triangle_uvs, triangle_textures = compute_triangle_textures(mesh, materials, corners, triangle_faces)
+    return {"mesh": mesh, "bvh": bvh, "edges": edges[valid],
+            # Index into "edges" of the edge leaving every corner (-1 for skipped edges)
+            "corner_edges": np.where(valid, np.cumsum(valid) - 1, -1)[corner_edges],
+            "triangles": triangles[valid_triangles], "triangle_faces": triangle_faces,
+            "face_colors": face_colors, "textured_faces": textured_faces,
+            "triangle_uvs": triangle_uvs, "triangle_textures": triangle_textures,
+            "boundary_edges": np.count_nonzero(boundary), "non_manifold_edges": np.count_nonzero(non_manifold)}
+
+# Append simplified levels to a model as they are built (runs on a background thread)
+def build_model_lods(model):
+    full = model["levels"][0]
     try:
-        min_x = max(0, min(p[0] for p in points_2d))
-        max_x = min(screen_width, max(p[0] for p in points_2d))
-        min_y = max(0, min(p[1] for p in points_2d))
-        max_y = min(screen_height, max(p[1] for p in points_2d))
-        if min_x >= max_x or min_y >= max_y:
-            return
-        tex_width, tex_height = texture.get_size()
-        scaled_texture = pygame.transform.scale(texture, (int(max_x - min_x), int(max_y - min_y)))
-        for i, uv in enumerate(tex_coords):
-            if uv[0] < 0 or uv[0] > 1 or uv[1] < 0 or uv[1] > 1:
-                tex_coords[i] = [max(0, min(1, uv[0])), max(0, min(1, uv[1]))]
-        screen.blit(scaled_texture, (min_x, min_y))
+        for lod_mesh, source_faces in build_lods(full["mesh"]):
+            if model.get("evicted"):
+                return
+            bvh = BVH.build(lod_mesh.vertices, lod_mesh.indices, lod_mesh.offsets)
+            # Taken before the colors are read, so textures attached meanwhile still reach this level
+            textures = model["textures"]
+            level = prepare_level(model["name"], lod_mesh, model["materials"], full["face_colors"][source_faces],
+                                  full["textured_faces"][source_faces], bvh)
+            level["texture_set"] = textures
+            model["levels"].append(level)
     except Exception as e:
-        print(f"Error drawing textured triangle: {e}")
+        print(f"Error building levels of detail for model '{model['name']}': {e}")
+
+# Every few vertices of a model as a mesh without faces, drawn as a point cloud when frames
+# stay over budget even at the coarsest level of detail
+MAX_CLOUD_POINTS = 20000
+def point_cloud_level(model):
+    if "point_cloud" not in model:
+        vertices = model["mesh"].vertices
+        stride = max(1, -(-len(vertices) // MAX_CLOUD_POINTS))
+        cloud = Mesh.from_polygons(vertices[::stride], [])
+        face_colors, textured_faces = compute_face_colors(cloud, {})
+        model["point_cloud"] = prepare_level(model["name"], cloud, {}, face_colors, textured_faces,
+                                             BVH.build(cloud.vertices, cloud.indices, cloud.offsets))
+    return model["point_cloud"]
 
 # Default cube
 def create_default_cube():
@@ -158,308 +251,619 @@ def create_default_cube():
         [-1, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1]
     ])
     faces = [
-        {'vertices': [0, 1, 2, 3], 'tex_coords': [-1, -1, -1, -1], 'material': None},
-        {'vertices': [4, 5, 6, 7], 'tex_coords': [-1, -1, -1, -1], 'material': None},
-        {'vertices': [0, 1, 5, 4], 'tex_coords': [-1, -1, -1, -1], 'material': None},
-        {'vertices': [2, 3, 7, 6], 'tex_coords': [-1, -1, -1, -1], 'material': None},
-        {'vertices': [0, 3, 7, 4], 'tex_coords': [-1, -1, -1, -1], 'material': None},
-        {'vertices': [1, 2, 6, 5], 'tex_coords': [-1, -1, -1, -1], 'material': None}
+        [3, 2, 1, 0],
+        [4, 5, 6, 7],
+        [0, 1, 5, 4],
+        [2, 3, 7, 6],
+        [4, 7, 3, 0],
+        [1, 2, 6, 5]
     ]
-    tex_coords = []
     materials = {}
-    return vertices, tex_coords, faces, materials
-
-# Load multiple models
-models = []
-max_models = 5
-for i in range(max_models):
-    if i == 0:
-        obj_path = input("Enter path to your .obj file (or press Enter for default cube): ").strip()
-    else:
-        obj_path = input(f"Enter path to additional .obj file {i+1} (or press Enter to skip): ").strip()
-    obj_path = os.path.normpath(obj_path) if obj_path else ""
-    if not obj_path:
-        print(f"No path provided for model {i+1}, using default cube")
-        vertices, tex_coords, faces, materials = create_default_cube()
-        models.append({"vertices": vertices, "tex_coords": tex_coords, "faces": faces, "materials": materials, "edges": [], "name": "Default Cube"})
-    elif os.path.exists(obj_path):
-        vertices, tex_coords, faces, materials = load_obj(obj_path)
-        if vertices is None:
-            print(f"Loading failed for model {i+1}, using default cube")
-            vertices, tex_coords, faces, materials = create_default_cube()
-            models.append({"vertices": vertices, "tex_coords": tex_coords, "faces": faces, "materials": materials, "edges": [], "name": "Default Cube"})
+    return Mesh.from_polygons(vertices, faces), materials
+
+# Ask for up to MAX_MODELS paths on the terminal; empty ones become the default cube
+def prompt_model_paths():
+    obj_paths = []
+    for i in range(MAX_MODELS):
+        if i == 0:
+            obj_path = input("Enter path to your .obj file (or press Enter for default cube): ").strip()
         else:
-            models.append({"vertices": vertices, "tex_coords": tex_coords, "faces": faces, "materials": materials, "edges": [], "name": os.path.basename(obj_path)})
+            obj_path = input(f"Enter path to additional .obj file {i+1} (or press Enter to skip): ").strip()
+        obj_paths.append(obj_path)
+    return obj_paths
+
+# Load models ("" for the default cube), parsing their OBJ files in parallel, and yield
+# (obj_path, model) as each one is ready; runs on a model library thread
+def load_models(obj_paths, max_texture_size=MAX_TEXTURE_SIZE):
+    found = {}
+    for obj_path in obj_paths:
+        path = os.path.normpath(obj_path) if obj_path else ""
+        if path and not os.path.exists(path):
+            print(f"File not found at '{path}', using default cube")
+            path = ""
+        found[obj_path] = path
+    if "" in found.values():
+        model = create_model("", None, None)
+        for obj_path, path in found.items():
+            if not path:
+                yield obj_path, model
+    for filename, mesh, materials in iter_objs([path for path in found.values() if path], max_texture_size):
+        try:
+            model = create_model(filename, mesh, materials)
+        except Exception as e:
+            # A model that can't be prepared (an OBJ without vertices...) doesn't stop the others
+            print(f"Error preparing model '{filename}': {e}")
+            release_textures({"materials": materials})
+            model = create_model(filename, None, None)
+        for obj_path, path in found.items():
+            if path == filename:
+                yield obj_path, model
+
+# Load one model ("" for the default cube)
+def load_model(obj_path, max_texture_size=MAX_TEXTURE_SIZE):
+    return next(load_models([obj_path], max_texture_size))[1]
+
+# Model data for a loaded mesh (the default cube when mesh is None), with its levels of
+# detail building in the background
+def create_model(obj_path, mesh, materials):
+    if mesh is None:
+        if obj_path:
+            print(f"Loading failed for '{obj_path}', using default cube")
+        mesh, materials = create_default_cube()
+        model = {"mesh": mesh, "materials": materials, "name": "Default Cube", "path": None}
+    else:
+        model = {"mesh": mesh, "materials": materials, "name": os.path.basename(obj_path), "path": obj_path}
+    # Textures still decoding, attached by attach_textures() once they are all ready
+    model["pending_textures"] = [material['texture_key'] for material in materials.values()
+                                 if material.get('texture_key') is not None and not material.get('texture')]
+    prepare_model(model)
+    # Simplified levels of detail are built in the background and used as soon as they appear
+    threading.Thread(target=build_model_lods, args=(model,), daemon=True).start()
+    return model
+
+# Center and scale a loaded model into view and build its full-detail render data
+def prepare_model(model):
+    mesh = model["mesh"]
+    # Face BVH over the vertices as loaded (cached next to the mesh), moved along with the normalization
+    if model["path"]:
+        bvh = load_bvh(model["path"], mesh)
     else:
-        print(f"File not found at '{obj_path}' for model {i+1}, using default cube")
-        vertices, tex_coords, faces, materials = create_default_cube()
-        models.append({"vertices": vertices, "tex_coords": tex_coords, "faces": faces, "materials": materials, "edges": [], "name": "Default Cube"})
-
-# Process models
-for model in models:
-    vertices = model["vertices"]
-    faces = model["faces"]
-    vertices = vertices - np.mean(vertices, axis=0)
+        bvh = BVH.build(mesh.vertices, mesh.indices, mesh.offsets)
+    center = np.mean(mesh.vertices, axis=0)
+    vertices = mesh.vertices - center
     max_distance = np.max(np.abs(vertices))
     if max_distance > 0:
         vertices = vertices / max_distance * 2
-    model["vertices"] = vertices
-    edges = set()
-    for face in faces:
-        face_verts = face['vertices']
-        for i in range(len(face_verts)):
-            edge = (min(face_verts[i], face_verts[(i+1) % len(face_verts)]), max(face_verts[i], face_verts[(i+1) % len(face_verts)]))
-            edges.add(edge)
-    model["edges"] = list(edges)
-    print(f"Model '{model['name']}': {len(model['edges'])} edges")
-
-# Camera and control variables
-camera_distance = 5
-translate_x, translate_y = 0, 0
-rotation_speed = 0.05
-show_normals = False
-model_scale = 1.0
-use_lighting = False
-light_dir = np.array([0, 0, -1])
-color_index = 0
-current_model = 0
-auto_mode = None
-wireframe_mode = True
-show_vertices = True
-mouse_dragging = False
-last_mouse_pos = None
-
-# Main loop
-clock = pygame.time.Clock()
-running = True
-angle_x, angle_y = 0, 0
-
-print("\nControls:")
-print("1-5: Switch models")
-print("Arrow keys: Rotate model")
-print("WASD: Pan model")
-print("Mouse wheel: Zoom in/out")
-print("Page Up/Down: Zoom in/out (coarser)")
-print("Q/E: Scale model up/down")
-print("A: Toggle auto-rotation/orbit")
-print("Space: Toggle wireframe/solid mode")
-print("V: Toggle vertex display")
-print("N: Toggle normal display")
-print("L: Toggle lighting")
-print("C: Cycle colors")
-print("B: Cycle background color")
-print("S: Save screenshot")
-print("R: Reset view")
-print("+/-: Adjust rotation speed")
-print("ESC: Exit")
-
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
+    mesh.vertices = vertices
+    bvh.transform(center, 2 / max_distance if max_distance > 0 else 1)
+    model["radius"] = np.max(np.linalg.norm(vertices, axis=1)) if len(vertices) else 0.0
+    model["textures"] = TextureSet(material_textures(mesh, model["materials"])[0])
+    face_colors, textured_faces = compute_face_colors(mesh, model["materials"])
+    level = prepare_level(model["name"], mesh, model["materials"], face_colors, textured_faces, bvh)
+    level["texture_set"] = model["textures"]
+    model["levels"] = [level]
+    print(f"Model '{model['name']}': {len(level['edges'])} edges "
+          f"({level['boundary_edges']} boundary, {level['non_manifold_edges']} non-manifold)")
+
+# A JSON config as command line options, so its values get the same type and choice checks;
+# returns the option tokens and the model paths it lists. Keys are option names (with - or _)
+# or "models"; unknown keys are an error
+def config_arguments(parser, config):
+    if not isinstance(config, dict):
+        parser.error("The config file must hold a JSON object")
+    actions = {action.dest: action for action in parser._actions if action.dest not in ('help', 'config')}
+    tokens = []
+    models = []
+    for key, value in config.items():
+        action = actions.get(key.replace('-', '_'))
+        if action is None:
+            parser.error(f"Unknown option '{key}' in config file")
+        if not action.option_strings:
+            models = [str(path) for path in value] if isinstance(value, list) else [str(value)]
+        elif action.nargs == 0:
+            if not isinstance(value, bool):
+                parser.error(f"Option '{key}' in config file must be true or false")
+            if value:
+                tokens.append(action.option_strings[-1])
+        elif isinstance(action.nargs, int):
+            if not isinstance(value, list) or len(value) != action.nargs:
+                parser.error(f"Option '{key}' in config file must be a list of {action.nargs} values")
+            tokens += [action.option_strings[-1]] + [str(item) for item in value]
+        elif value is not None:
+            tokens.append(f"{action.option_strings[-1]}={value}")
+    return tokens, models
+
+# Command line options; a JSON config file (keys named like the options) supplies defaults
+# that options given on the command line override
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Interactive OBJ file viewer")
+    parser.add_argument('models', nargs='*', help=f"OBJ files to view (up to {MAX_MODELS}, switched with keys 1-5)")
+    parser.add_argument('--config', help="JSON file with default values for these options")
+    parser.add_argument('--mode', choices=["wireframe", "solid"], default="wireframe", help="Initial render mode")
+    parser.add_argument('--backend', choices=["numpy", "pygame"], default="numpy", help="Initial drawing backend")
+    parser.add_argument('--width', type=int, default=SCREEN_WIDTH, help="Window width")
+    parser.add_argument('--height', type=int, default=SCREEN_HEIGHT, help="Window height")
+    parser.add_argument('--distance', type=float, default=CAMERA_DISTANCE, help="Initial camera distance")
+    parser.add_argument('--angle-x', type=float, default=0.0, help="Initial rotation about the x axis (radians)")
+    parser.add_argument('--angle-y', type=float, default=0.0, help="Initial rotation about the y axis (radians)")
+    parser.add_argument('--scale', type=float, default=1.0, help="Initial model scale")
+    parser.add_argument('--pan', type=int, nargs=2, default=[0, 0], metavar=('X', 'Y'), help="Initial pan in pixels")
+    parser.add_argument('--memory-mb', type=int, default=MEMORY_BUDGET_MB,
+                        help="Memory for loaded models before the least recently used are unloaded")
+    parser.add_argument('--max-texture-size', type=int, default=MAX_TEXTURE_SIZE,
+                        help="Shrink textures so neither side exceeds this many pixels")
+    parser.add_argument('--prompt', action='store_true', help="Ask for model paths on the terminal")
+    parser.add_argument('--trace', default=TRACE_PATH, metavar='PATH',
+                        help="Record every frame's stage timings to this CSV or JSON Lines (.json/.jsonl) file")
+    argv = sys.argv[1:] if argv is None else list(argv)
+    known = parser.parse_known_args(argv)[0]
+    if known.config:
+        try:
+            with open(known.config, 'r') as f:
+                config = json.load(f)
+        except Exception as e:
+            parser.error(f"Error loading config file '{known.config}': {e}")
+        # Parsed ahead of the command line, whose options come later and win; its models replace the config's
+        tokens, models = config_arguments(parser, config)
+        argv = tokens + argv + ([] if known.models else models)
+    args = parser.parse_args(argv)
+    if len(args.models) > MAX_MODELS:
+        parser.error(f"At most {MAX_MODELS} models can be viewed at once")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Without model paths, ask for them when run from a terminal, as before
+    if args.prompt or (not args.models and sys.stdin.isatty()):
+        obj_paths = prompt_model_paths()
+    else:
+        obj_paths = args.models or [""]
+
+    # Initialize pygame
+    pygame.init()
+    screen_width, screen_height = args.width, args.height
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    pygame.display.set_caption("OBJ File Viewer")
+    # Models are loaded in the background when first shown
+    models = ModelLibrary(obj_paths, lambda paths: load_models(paths, args.max_texture_size), args.memory_mb * 1024 * 1024,
+                          release_textures)
+
+    # Camera and control variables
+    camera_distance = args.distance
+    translate_x, translate_y = args.pan
+    rotation_speed = 0.05
+    show_normals = False
+    model_scale = args.scale
+    use_lighting = False
+    light_dir = np.array([0, 0, -1])
+    color_index = 0
+    current_model = 0
+    auto_mode = None
+    wireframe_mode = args.mode == "wireframe"
+    show_vertices = True
+    mouse_dragging = False
+    last_mouse_pos = None
+    render_backends = ["pygame", "numpy"]
+    render_backend = args.backend
+    backface_culling = True
+    picked = None
+    auto_lod = True
+    lod_level = 0
+    edge_color = WHITE
+    vertex_color = RED
+    bg_color = BLACK
+    bg_color_index = 0
+    scheduler = FrameScheduler()
+    framebuffer = Framebuffer(screen_width, screen_height)
+    hud = Hud(WHITE)
+    profiler = Profiler(args.trace)
+    profile_hud = Hud(WHITE, 20, (screen_width - 230, 10))
+    show_profile = False
+    scene = None
+    scene_state = None
+    idle = False
+
+    # Main loop
+    clock = pygame.time.Clock()
+    running = True
+    angle_x, angle_y = args.angle_x, args.angle_y
+
+    print("\nControls:")
+    print("1-5: Switch models")
+    print("Arrow keys: Rotate model")
+    print("WASD: Pan model")
+    print("Left click: Pick face and vertex (drag to pan)")
+    print("Mouse wheel: Zoom in/out")
+    print("Page Up/Down: Zoom in/out (coarser)")
+    print("Q/E: Scale model up/down")
+    print("A: Toggle auto-rotation/orbit")
+    print("Space: Toggle wireframe/solid mode")
+    print("V: Toggle vertex display")
+    print("F: Toggle drawing backend (numpy z-buffer/pygame)")
+    print("K: Toggle back-face culling")
+    print("O: Toggle automatic level of detail")
+    print("P: Toggle performance overlay")
+    print("N: Toggle normal display")
+    print("L: Toggle lighting")
+    print("C: Cycle colors")
+    print("B: Cycle background color")
+    print("S: Save screenshot")
+    print("R: Reset view")
+    print("+/-: Adjust rotation speed")
+    print("ESC: Exit")
+
+    while running:
+        # Sleep until there is input while nothing on screen is changing
+        events = pygame.event.get()
+        if idle and not events:
+            event = pygame.event.wait(IDLE_WAIT_MS)
+            events = [event] + pygame.event.get() if event.type != pygame.NOEVENT else []
+        scheduler.start_frame()
+        for event in events:
+            if event.type == pygame.QUIT:
                 running = False
-            elif event.key == pygame.K_SPACE:
-                wireframe_mode = not wireframe_mode
-            elif event.key == pygame.K_v:
-                show_vertices = not show_vertices
-            elif event.key == pygame.K_n:
-                show_normals = not show_normals
-            elif event.key == pygame.K_l:
-                use_lighting = not use_lighting
-            elif event.key == pygame.K_c:
-                color_index = (color_index + 1) % len(COLORS)
-                edge_color = COLORS[color_index]
-                vertex_color = COLORS[(color_index + 1) % len(COLORS)]
-                print(f"Color changed to {COLORS[color_index]}")
-            elif event.key == pygame.K_b:
-                bg_color_index = (bg_color_index + 1) % len(BG_COLORS)
-                bg_color = BG_COLORS[bg_color_index]
-                print(f"Background color changed to {bg_color}")
-            elif event.key == pygame.K_s:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                pygame.image.save(screen, f"screenshot_{timestamp}.png")
-                print(f"Screenshot saved as screenshot_{timestamp}.png")
-            elif event.key == pygame.K_r:
-                angle_x, angle_y = 0, 0
-                camera_distance = 5
-                translate_x, translate_y = 0, 0
-                rotation_speed = 0.05
-                model_scale = 1.0
-                auto_mode = None
-            elif event.key == pygame.K_a:
-                if auto_mode is None:
-                    auto_mode = "rotate"
-                    print("Auto-rotation enabled")
-                elif auto_mode == "rotate":
-                    auto_mode = "orbit"
-                    print("Orbit mode enabled")
-                else:
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                elif event.key == pygame.K_SPACE:
+                    wireframe_mode = not wireframe_mode
+                elif event.key == pygame.K_v:
+                    show_vertices = not show_vertices
+                elif event.key == pygame.K_f:
+                    render_backend = render_backends[(render_backends.index(render_backend) + 1) % len(render_backends)]
+                    print(f"Drawing backend: {render_backend}")
+                elif event.key == pygame.K_k:
+                    backface_culling = not backface_culling
+                    print(f"Back-face culling {'enabled' if backface_culling else 'disabled'}")
+                elif event.key == pygame.K_o:
+                    auto_lod = not auto_lod
+                    print(f"Automatic level of detail {'enabled' if auto_lod else 'disabled'}")
+                elif event.key == pygame.K_p:
+                    show_profile = not show_profile
+                elif event.key == pygame.K_n:
+                    show_normals = not show_normals
+                elif event.key == pygame.K_l:
+                    use_lighting = not use_lighting
+                elif event.key == pygame.K_c:
+                    color_index = (color_index + 1) % len(COLORS)
+                    edge_color = COLORS[color_index]
+                    vertex_color = COLORS[(color_index + 1) % len(COLORS)]
+                    print(f"Color changed to {COLORS[color_index]}")
+                elif event.key == pygame.K_b:
+                    bg_color_index = (bg_color_index + 1) % len(BG_COLORS)
+                    bg_color = BG_COLORS[bg_color_index]
+                    print(f"Background color changed to {bg_color}")
+                elif event.key == pygame.K_s:
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    pygame.image.save(screen, f"screenshot_{timestamp}.png")
+                    print(f"Screenshot saved as screenshot_{timestamp}.png")
+                elif event.key == pygame.K_r:
+                    angle_x, angle_y = args.angle_x, args.angle_y
+                    camera_distance = args.distance
+                    translate_x, translate_y = args.pan
+                    rotation_speed = 0.05
+                    model_scale = args.scale
                     auto_mode = None
-                    print("Auto mode disabled")
-            elif event.key == pygame.K_PLUS or event.key == pygame.K_EQUALS:
-                rotation_speed = min(0.2, rotation_speed + 0.01)
-                print(f"Rotation speed: {rotation_speed:.2f}")
-            elif event.key == pygame.K_MINUS:
-                rotation_speed = max(0.01, rotation_speed - 0.01)
-                print(f"Rotation speed: {rotation_speed:.2f}")
-            elif event.key == pygame.K_PAGEUP:
-                camera_distance -= 0.5
-            elif event.key == pygame.K_PAGEDOWN:
-                camera_distance += 0.5
-            elif event.key == pygame.K_q:
-                model_scale *= 1.1
-                print(f"Model scale: {model_scale:.2f}")
-            elif event.key == pygame.K_e:
-                model_scale = max(0.1, model_scale / 1.1)
-                print(f"Model scale: {model_scale:.2f}")
-            elif event.key in (pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4, pygame.K_5):
-                index = int(pygame.key.name(event.key)) - 1
-                if 0 <= index < len(models):
-                    current_model = index
-                    print(f"Switched to model '{models[current_model]['name']}'")
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            if event.button == 4:
-                camera_distance -= 0.2
-            elif event.button == 5:
-                camera_distance += 0.2
-            elif event.button == 1:
-                mouse_dragging = True
+                    picked = None
+                elif event.key == pygame.K_a:
+                    if auto_mode is None:
+                        auto_mode = "rotate"
+                        print("Auto-rotation enabled")
+                    elif auto_mode == "rotate":
+                        auto_mode = "orbit"
+                        print("Orbit mode enabled")
+                    else:
+                        auto_mode = None
+                        print("Auto mode disabled")
+                elif event.key == pygame.K_PLUS or event.key == pygame.K_EQUALS:
+                    rotation_speed = min(0.2, rotation_speed + 0.01)
+                    print(f"Rotation speed: {rotation_speed:.2f}")
+                elif event.key == pygame.K_MINUS:
+                    rotation_speed = max(0.01, rotation_speed - 0.01)
+                    print(f"Rotation speed: {rotation_speed:.2f}")
+                elif event.key == pygame.K_PAGEUP:
+                    camera_distance -= 0.5
+                elif event.key == pygame.K_PAGEDOWN:
+                    camera_distance += 0.5
+                elif event.key == pygame.K_q:
+                    model_scale *= 1.1
+                    print(f"Model scale: {model_scale:.2f}")
+                elif event.key == pygame.K_e:
+                    model_scale = max(0.1, model_scale / 1.1)
+                    print(f"Model scale: {model_scale:.2f}")
+                elif event.key in (pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4, pygame.K_5):
+                    index = int(pygame.key.name(event.key)) - 1
+                    if 0 <= index < len(models):
+                        current_model = index
+                        picked = None
+                        lod_level = 0
+                        print(f"Switched to model '{models.name(current_model)}'")
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                if event.button == 4:
+                    camera_distance -= 0.2
+                elif event.button == 5:
+                    camera_distance += 0.2
+                elif event.button == 1:
+                    mouse_dragging = True
+                    last_mouse_pos = event.pos
+                    # Pick the face and vertex under the cursor through the model's BVH
+                    origin, direction = screen_ray(event.pos[0], event.pos[1], view_matrix(angle_x, angle_y, model_scale),
+                                                   translate_x, translate_y, camera_distance, screen_width, screen_height)
+                    model = models.get(current_model)
+                    picked = pick(model["mesh"], model["levels"][0]["bvh"], origin, direction) if model else None
+            elif event.type == pygame.MOUSEBUTTONUP:
+                if event.button == 1:
+                    mouse_dragging = False
+            elif event.type == pygame.MOUSEMOTION and mouse_dragging:
+                dx, dy = event.pos[0] - last_mouse_pos[0], event.pos[1] - last_mouse_pos[1]
+                translate_x += dx
+                translate_y += dy
                 last_mouse_pos = event.pos
-        elif event.type == pygame.MOUSEBUTTONUP:
-            if event.button == 1:
-                mouse_dragging = False
-        elif event.type == pygame.MOUSEMOTION and mouse_dragging:
-            dx, dy = event.pos[0] - last_mouse_pos[0], event.pos[1] - last_mouse_pos[1]
-            translate_x += dx
-            translate_y += dy
-            last_mouse_pos = event.pos
     
-    # Handle keyboard input
-    keys = pygame.key.get_pressed()
-    if not auto_mode:
-        if keys[pygame.K_LEFT]:
-            angle_y -= rotation_speed
-        if keys[pygame.K_RIGHT]:
-            angle_y += rotation_speed
-        if keys[pygame.K_UP]:
-            angle_x -= rotation_speed
-        if keys[pygame.K_DOWN]:
-            angle_x += rotation_speed
-    if auto_mode == "rotate":
-        angle_y += 0.02
-    elif auto_mode == "orbit":
-        angle_y += 0.02
-        angle_x += 0.01
-    if keys[pygame.K_w]:
-        translate_y -= 5
-    if keys[pygame.K_s]:
-        translate_y += 5
-    if keys[pygame.K_a]:
-        translate_x -= 5
-    if keys[pygame.K_d]:
-        translate_x += 5
+        # Handle keyboard input
+        keys = pygame.key.get_pressed()
+        if not auto_mode:
+            if keys[pygame.K_LEFT]:
+                angle_y -= rotation_speed
+            if keys[pygame.K_RIGHT]:
+                angle_y += rotation_speed
+            if keys[pygame.K_UP]:
+                angle_x -= rotation_speed
+            if keys[pygame.K_DOWN]:
+                angle_x += rotation_speed
+        if auto_mode == "rotate":
+            angle_y += 0.02
+        elif auto_mode == "orbit":
+            angle_y += 0.02
+            angle_x += 0.01
+        if keys[pygame.K_w]:
+            translate_y -= 5
+        if keys[pygame.K_s]:
+            translate_y += 5
+        if keys[pygame.K_a]:
+            translate_x -= 5
+        if keys[pygame.K_d]:
+            translate_x += 5
     
-    # Clear screen
-    screen.fill(bg_color)
+        scheduler.mark("events")
     
-    # Current model
-    vertices = models[current_model]["vertices"]
-    tex_coords = models[current_model]["tex_coords"]
-    faces = models[current_model]["faces"]
-    materials = models[current_model]["materials"]
-    edges = models[current_model]["edges"]
+        # Keep handling input while the current model loads (together with the next one, in
+        # parallel), and fetch the next one once it is ready
+        model = models.get(current_model, [(current_model + 1) % len(models)])
+        if model is None:
+            screen.fill(bg_color)
+            if models.state(current_model) == "failed":
+                loading_text = f"Could not load {models.name(current_model)}"
+            else:
+                loading_text = f"Loading {models.name(current_model)}... {models.loading_time(current_model):.0f} s"
+            hud.draw(screen, [loading_text])
+            pygame.display.flip()
+            idle = False
+            clock.tick(30)
+            continue
+        models.prefetch((current_model + 1) % len(models))
     
-    # Project vertices
-    projected_points = [project_point(v, angle_x, angle_y, translate_x, translate_y, model_scale) for v in vertices]
-    points_2d = [p[0] for p in projected_points]
-    z_values = [p[1] for p in projected_points]
+        # What the frame scheduler leaves of the requested quality while frames run over budget
+        quality = scheduler.quality
+        draw_vertices = show_vertices and quality < QUALITY_NO_VERTICES or quality >= QUALITY_POINTS
+        draw_normals = show_normals and quality < QUALITY_NO_NORMALS
+        draw_wireframe = wireframe_mode or quality >= QUALITY_WIREFRAME
     
-    # Draw faces
-    if not wireframe_mode:
-        face_depths = []
-        for i, face in enumerate(faces):
-            if len(face['vertices']) < 3:
-                continue
-            avg_z = np.mean([z_values[v] for v in face['vertices']])
-            face_depths.append((i, avg_z))
-        face_depths.sort(key=lambda x: x[1], reverse=True)
-        for face_idx, _ in face_depths:
-            face = faces[face_idx]
-            face_verts = face['vertices']
-            face_tex = face['tex_coords']
-            material = face['material']
-            normal, _ = calculate_face_normal_and_centroid(vertices, face_verts)
-            texture = None
-            if material and material in materials and materials[material]['texture']:
-                texture = materials[material]['texture']
-                uv_coords = [tex_coords[t] if t >= 0 else [0, 0] for t in face_tex]
-                try:
-                    face_points = [points_2d[v] for v in face_verts]
-                    draw_textured_triangle(screen, face_points, uv_coords, texture)
-                    continue
-                except Exception as e:
-                    print(f"Error applying texture to face {face_idx}: {e}")
-            color = COLORS[face_idx % len(COLORS)]
-            if use_lighting:
-                intensity = calculate_lighting(normal, light_dir)
-                color = [int(c * intensity) for c in color[:3]]
-                color = tuple(max(0, min(255, c)) for c in color)
-            try:
-                face_points = [points_2d[v] for v in face_verts]
-                pygame.draw.polygon(screen, color, face_points)
-            except Exception as e:
-                print(f"Error rendering face {face_idx}: {e}")
+        # Textures that finished decoding since the last frame show up as soon as they are ready
+        if attach_textures(model):
+            scene_state = None
+
+        # Current model, at the level of detail that suits its size on screen and the frame time
+        levels = list(model["levels"])
+        if auto_lod:
+            moving = (auto_mode is not None or mouse_dragging or keys[pygame.K_LEFT] or keys[pygame.K_RIGHT]
+                      or keys[pygame.K_UP] or keys[pygame.K_DOWN])
+            screen_radius = FOCAL_LENGTH * model["radius"] * model_scale / max(camera_distance, NEAR_PLANE)
+            lod_level = select_level([entry["mesh"].face_count for entry in levels], screen_radius,
+                                     scheduler.frame_time, lod_level, moving)
+        else:
+            lod_level = 0
+        if quality >= QUALITY_COARSEST_LOD:
+            lod_level = len(levels) - 1
+        level = point_cloud_level(model) if quality >= QUALITY_POINTS else levels[lod_level]
+        mesh = level["mesh"]
+        edges = level["edges"]
     
-    # Draw edges
-    for edge in edges:
-        try:
-            pygame.draw.line(screen, edge_color, points_2d[edge[0]], points_2d[edge[1]], 2)
-        except IndexError:
-            print(f"Invalid edge: {edge}")
+        # Redraw the scene only when something that shows on screen changed; otherwise reuse the last one
+        view_state = (current_model, len(levels), lod_level, quality, angle_x, angle_y, translate_x, translate_y,
+                      camera_distance, model_scale, wireframe_mode, show_vertices, show_normals, use_lighting,
+                      render_backend, backface_culling, edge_color, vertex_color, bg_color, picked)
+        idle = view_state == scene_state
+        if idle:
+            screen.blit(scene, (0, 0))
+            scheduler.mark("blit")
+            scheduler.idle()
+        else:
+            screen.fill(bg_color)
+        
+            # Transform to view space and project vertices
+            matrix = view_matrix(angle_x, angle_y, model_scale)
+            view_points = transform_points(mesh.vertices, matrix)
+            screen_points, z_values = project_view_points(view_points, translate_x, translate_y, camera_distance,
+                                                          screen_width, screen_height)
+            scheduler.mark("projection")
     
-    # Draw vertices
-    if show_vertices:
-        for point in points_2d:
-            pygame.draw.circle(screen, vertex_color, point, 3)
+            # Cull faces outside the view volume (skipping whole BVH subtrees) and back faces; edges and
+            # vertices are kept only when a remaining face uses them. Primitives crossing the near plane are clipped
+            near = NEAR_PLANE - camera_distance
+            in_frustum = level["bvh"].frustum_faces(frustum_planes(matrix, translate_x, translate_y, camera_distance,
+                                                                   screen_width, screen_height))
+            if backface_culling:
+                front_faces = front_facing(mesh.face_normals, mesh.face_centroids, matrix, camera_distance)
+            else:
+                front_faces = np.ones(mesh.face_count, dtype=bool)
+            candidate_faces = in_frustum & front_faces
+            face_edges = np.zeros(len(edges), dtype=bool)
+            corner_edges = level["corner_edges"][np.repeat(candidate_faces, mesh.face_sizes())]
+            face_edges[corner_edges[corner_edges >= 0]] = True
+            visible_vertices = np.ones(len(mesh.vertices), dtype=bool)
+            visible_vertices[edges] = False
+            visible_vertices[edges[face_edges]] = True
+            visible_vertices &= (view_points[:, 2] >= near) & inside_viewport(screen_points[:, None], screen_width, screen_height)
     
-    # Draw normals
-    if show_normals:
-        for face in faces:
-            if len(face['vertices']) < 3:
-                continue
-            normal, centroid = calculate_face_normal_and_centroid(vertices, face['vertices'])
-            normal_end = centroid + normal * 0.5 * model_scale
-            start, _ = project_point(centroid, angle_x, angle_y, translate_x, translate_y, model_scale)
-            end, _ = project_point(normal_end, angle_x, angle_y, translate_x, translate_y, model_scale)
-            pygame.draw.line(screen, YELLOW, start, end, 2)
+            in_front = view_points[edges, 2] >= near
+            whole_edges = face_edges & in_front.all(axis=1)
+            crossing_edges = face_edges & in_front.any(axis=1) & ~whole_edges
+            clipped_starts, clipped_ends = clip_segments_near(view_points[edges[crossing_edges, 0]],
+                                                              view_points[edges[crossing_edges, 1]], near)
+            clipped_points, _ = project_view_points(np.concatenate((clipped_starts, clipped_ends)), translate_x, translate_y,
+                                                    camera_distance, screen_width, screen_height)
+            edge_points = np.concatenate((screen_points[edges[whole_edges]],
+                                          clipped_points.reshape(2, -1, 2).transpose(1, 0, 2)))
+            edge_points = edge_points[inside_viewport(edge_points, screen_width, screen_height)]
     
-    # Show info
-    font = pygame.font.Font(None, 24)
-    mode_text = "Mode: " + ("Solid" if not wireframe_mode else "Wireframe")
-    screen.blit(font.render(mode_text, True, WHITE), (10, 10))
-    model_text = f"Model: {models[current_model]['name']}"
-    screen.blit(font.render(model_text, True, WHITE), (10, 40))
-    vertices_text = f"Vertices: {len(vertices)}"
-    screen.blit(font.render(vertices_text, True, WHITE), (10, 70))
-    faces_text = f"Faces: {len(faces)}"
-    screen.blit(font.render(faces_text, True, WHITE), (10, 100))
-    zoom_text = f"Zoom: {camera_distance:.1f}"
-    screen.blit(font.render(zoom_text, True, WHITE), (10, 130))
-    scale_text = f"Scale: {model_scale:.2f}"
-    screen.blit(font.render(scale_text, True, WHITE), (10, 160))
-    rot_speed_text = f"Rot Speed: {rotation_speed:.2f}"
-    screen.blit(font.render(rot_speed_text, True, WHITE), (10, 190))
-    fps_text = f"FPS: {int(clock.get_fps())}"
-    screen.blit(font.render(fps_text, True, WHITE), (10, 220))
-    lighting_text = f"Lighting: {'On' if use_lighting else 'Off'}"
-    screen.blit(font.render(lighting_text, True, WHITE), (10, 250))
-    auto_text = f"Auto: {auto_mode or 'Off'}"
-    screen.blit(font.render(auto_text, True, WHITE), (10, 280))
+            drawn_faces = np.zeros(mesh.face_count, dtype=bool)
+            if not draw_wireframe:
+                front_triangles = np.flatnonzero(candidate_faces[level["triangle_faces"]])
+                new_points, triangles, sources, triangle_uvs = clip_triangles_near(
+                    view_points, level["triangles"][front_triangles], level["triangle_uvs"][front_triangles], near)
+                new_screen_points, new_z_values = project_view_points(new_points, translate_x, translate_y, camera_distance,
+                                                                      screen_width, screen_height)
+                triangle_points = np.concatenate((screen_points, new_screen_points))
+                triangle_depths = np.concatenate((z_values, new_z_values))
+                inside = inside_viewport(triangle_points[triangles], screen_width, screen_height)
+                triangles, triangle_uvs = triangles[inside], triangle_uvs[inside]
+                sources = front_triangles[sources[inside]]
+                drawn_faces[level["triangle_faces"][sources]] = True
+            scheduler.mark("culling")
     
-    # Update display
-    pygame.display.flip()
-    clock.tick(60)
+            # Draw faces (painter's algorithm on the pygame backend)
+            if not draw_wireframe and render_backend == "pygame":
+                # Faces crossing the near plane can't be drawn as one polygon, so they are skipped here
+                crossing_faces = np.zeros(mesh.face_count, dtype=bool)
+                crossing_faces[level["triangle_faces"][(z_values[level["triangles"]] < NEAR_PLANE).any(axis=1)]] = True
+                drawn_faces &= ~crossing_faces
+                polygons = np.flatnonzero((mesh.face_sizes() >= 3) & drawn_faces)
+                face_depths = mesh.face_mean(z_values)[polygons]
+                face_order = polygons[np.argsort(-face_depths, kind='stable')]
+                scheduler.mark("sorting")
+                if use_lighting:
+                    intensities = calculate_lighting(mesh.face_normals @ rotation_matrix(angle_x, angle_y).T, light_dir)
+                # Textured faces are flat-filled with the texture's average color on this backend
+                points_2d = screen_points.tolist()
+                face_colors = level["face_colors"].tolist()
+                textured_faces = level["textured_faces"]
+                for face_idx in face_order.tolist():
+                    face_verts = mesh.face(face_idx).tolist()
+                    color = face_colors[face_idx]
+                    if use_lighting and not textured_faces[face_idx]:
+                        color = tuple(int(c * intensities[face_idx]) for c in color)
+                    try:
+                        face_points = [points_2d[v] for v in face_verts]
+                        pygame.draw.polygon(screen, color, face_points)
+                    except Exception as e:
+                        print(f"Error rendering face {face_idx}: {e}")
+                scheduler.mark("faces")
+    
+            vertex_radius = 1 if quality >= QUALITY_POINTS else 3
+            if render_backend == "numpy":
+                # Z-buffer faces, then rasterize edges and vertices on top and push the buffer in one blit
+                framebuffer.clear(bg_color)
+                if not draw_wireframe:
+                    face_colors = level["face_colors"]
+                    if use_lighting:
+                        lit = ~level["textured_faces"]
+                        intensities = calculate_lighting(mesh.face_normals[lit] @ rotation_matrix(angle_x, angle_y).T, light_dir)
+                        face_colors = face_colors.copy()
+                        face_colors[lit] = (face_colors[lit] * intensities[:, None]).astype(np.uint8)
+                    draw_triangles(framebuffer, triangle_points, triangle_depths, triangles,
+                                   face_colors[level["triangle_faces"][sources]], triangle_uvs,
+                                   level["triangle_textures"][sources], model["textures"])
+                    scheduler.mark("faces")
+                draw_lines(framebuffer, edge_points[:, 0], edge_points[:, 1], edge_color, 2)
+                scheduler.mark("edges")
+                if draw_vertices:
+                    draw_points(framebuffer, screen_points[visible_vertices], vertex_color, vertex_radius)
+                    scheduler.mark("vertices")
+                framebuffer.present(screen)
+                scheduler.mark("blit")
+            else:
+                # Draw edges
+                for start, end in edge_points.tolist():
+                    pygame.draw.line(screen, edge_color, start, end, 2)
+                scheduler.mark("edges")
+        
+                # Draw vertices
+                if draw_vertices:
+                    for point in screen_points[visible_vertices].tolist():
+                        pygame.draw.circle(screen, vertex_color, point, vertex_radius)
+                    scheduler.mark("vertices")
+    
+            # Draw normals
+            if draw_normals:
+                has_normal = np.any(mesh.face_normals, axis=1) & candidate_faces
+                centroids = mesh.face_centroids[has_normal]
+                normal_ends = centroids + mesh.face_normals[has_normal] * 0.5 * model_scale
+                if len(centroids):
+                    normal_points, _ = project_points(np.vstack([centroids, normal_ends]), angle_x, angle_y,
+                                                      translate_x, translate_y, model_scale,
+                                                      camera_distance, screen_width, screen_height)
+                    normal_points = normal_points.tolist()
+                    for start, end in zip(normal_points[:len(centroids)], normal_points[len(centroids):]):
+                        pygame.draw.line(screen, YELLOW, start, end, 2)
+                scheduler.mark("normals")
+    
+            # Outline the picked face and mark its nearest vertex (both refer to the full-detail mesh)
+            if picked:
+                full_mesh = model["mesh"]
+                face_verts = full_mesh.face(picked[0])
+                face_verts = face_verts[(face_verts >= 0) & (face_verts < len(full_mesh.vertices))]
+                picked_points, picked_depths = project_points(full_mesh.vertices[np.append(face_verts, picked[1])],
+                                                              angle_x, angle_y, translate_x, translate_y, model_scale,
+                                                              camera_distance, screen_width, screen_height)
+                if len(face_verts) >= 2 and (picked_depths[:-1] >= NEAR_PLANE).all():
+                    pygame.draw.lines(screen, YELLOW, True, picked_points[:-1].tolist(), 2)
+                if picked_depths[-1] >= NEAR_PLANE:
+                    pygame.draw.circle(screen, YELLOW, picked_points[-1].tolist(), 5)
+                scheduler.mark("highlight")
+            scene = screen.copy()
+            scene_state = view_state
+            scheduler.mark("blit")
+    
+        # Show info (whole milliseconds keep the overlay from changing on every frame)
+        stages = scheduler.frame_stages or scheduler.stage_times
+        slowest = max(stages, key=stages.get, default=None)
+        hud.draw(screen, [
+            "Mode: " + ("Solid" if not wireframe_mode else "Wireframe"),
+            f"Model: {model['name']}",
+            f"Vertices: {len(model['mesh'].vertices)}",
+            f"Faces: {model['mesh'].face_count}",
+            f"Zoom: {camera_distance:.1f}",
+            f"Scale: {model_scale:.2f}",
+            f"Rot Speed: {rotation_speed:.2f}",
+            f"FPS: {int(clock.get_fps())}",
+            f"Lighting: {'On' if use_lighting else 'Off'}",
+            f"Auto: {auto_mode or 'Off'}",
+            f"Backend: {render_backend}",
+            (f"Culled: {mesh.face_count - np.count_nonzero(front_faces)} back faces, "
+             f"{np.count_nonzero(front_faces & ~in_frustum)} outside view"),
+            (f"Drawn: {np.count_nonzero(drawn_faces)}/{mesh.face_count} faces, "
+             f"{len(edge_points)}/{len(edges)} edges, {np.count_nonzero(visible_vertices)}/{len(mesh.vertices)} verts"),
+            f"Picked: face {picked[0]}, vertex {picked[1]}" if picked else "Picked: none",
+            f"LOD: {lod_level + 1}/{len(levels)} ({mesh.face_count} faces{', auto' if auto_lod else ''})",
+            # Timings are those of the last frame that was actually drawn
+            (f"Quality: {scheduler.quality_name} ({scheduler.rolling_frame_time(10) * 1000:.0f} ms/frame"
+             + (f", slowest {slowest} {stages[slowest] * 1000:.0f} ms)" if slowest else ")"))
+        ])
+        if show_profile:
+            profile_hud.draw(screen, profiler.summary())
+        scheduler.mark("hud")
+    
+        # Update display
+        pygame.display.flip()
+        scheduler.mark("flip")
+        profiler.record(scheduler.stage_times, idle)
+        if not idle:
+            scheduler.end_frame()
+        clock.tick(60)
+
+    profiler.close()
+    pygame.quit()
 
-pygame.quit()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import numpy as np
+
+class Mesh:
+    # Faces are stored CSR-style: corners of face i are indices[offsets[i]:offsets[i + 1]]
+    __slots__ = ('vertices', 'indices', 'offsets', 'uv_indices', 'uvs',
+                 'material_ids', 'material_names', 'normal_indices', 'normals',
+                 'face_normals', 'face_centroids', 'triangle_corners', 'triangle_faces')
+
+    # Array fields that fully describe the mesh (with material_names), e.g. for caching
+    ARRAY_FIELDS = ('vertices', 'indices', 'offsets', 'uv_indices', 'uvs',
+                    'material_ids', 'normal_indices', 'normals')
+
+    def __init__(self, vertices, indices, offsets, uv_indices=None, uvs=None,
+                 material_ids=None, material_names=None, normal_indices=None, normals=None):
+        self.vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        face_count = len(self.offsets) - 1
+
+        # Per-corner texture coordinate indices (-1 when a corner has none)
+        if uv_indices is None:
+            uv_indices = np.full(len(self.indices), -1, dtype=np.int32)
+        self.uv_indices = np.asarray(uv_indices, dtype=np.int32)
+        self.uvs = np.zeros((0, 2)) if uvs is None else np.asarray(uvs, dtype=np.float64).reshape(-1, 2)
+
+        # Per-face material ids into material_names (-1 when a face has no material)
+        if material_ids is None:
+            material_ids = np.full(face_count, -1, dtype=np.int32)
+        self.material_ids = np.asarray(material_ids, dtype=np.int32)
+        self.material_names = list(material_names or [])
+
+        # Per-corner vertex normal indices from 'vn' records (-1 when a corner has none)
+        if normal_indices is None:
+            normal_indices = np.full(len(self.indices), -1, dtype=np.int32)
+        self.normal_indices = np.asarray(normal_indices, dtype=np.int32)
+        self.normals = np.zeros((0, 3)) if normals is None else np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+
+        self.face_normals = None
+        self.face_centroids = None
+        self.triangle_corners = None
+        self.triangle_faces = None
+
+    # Build a mesh from a list of per-face vertex index lists
+    @classmethod
+    def from_polygons(cls, vertices, polygons):
+        sizes = [len(polygon) for polygon in polygons]
+        offsets = np.zeros(len(polygons) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        indices = np.fromiter((i for polygon in polygons for i in polygon), dtype=np.int32, count=offsets[-1])
+        return cls(vertices, indices, offsets)
+
+    # Rebuild a mesh from a dict of ARRAY_FIELDS arrays
+    @classmethod
+    def from_arrays(cls, arrays, material_names):
+        return cls(arrays['vertices'], arrays['indices'], arrays['offsets'], arrays['uv_indices'],
+                   arrays['uvs'], arrays['material_ids'], material_names,
+                   arrays['normal_indices'], arrays['normals'])
+
+    # Dict of the ARRAY_FIELDS arrays
+    def arrays(self):
+        return {name: getattr(self, name) for name in self.ARRAY_FIELDS}
+
+    @property
+    def face_count(self):
+        return len(self.offsets) - 1
+
+    # Number of corners of every face
+    def face_sizes(self):
+        return np.diff(self.offsets)
+
+    # Vertex indices of a single face
+    def face(self, face_index):
+        return self.indices[self.offsets[face_index]:self.offsets[face_index + 1]]
+
+    # Sum per-corner values over each face, giving one row per face
+    def face_sum(self, values):
+        sizes = self.face_sizes()
+        result = np.zeros((len(sizes),) + values.shape[1:])
+        non_empty = sizes > 0
+        if non_empty.any():
+            result[non_empty] = np.add.reduceat(values, self.offsets[:-1][non_empty], axis=0)
+        return result
+
+    # Average per-vertex values (e.g. depths) over the corners of each face
+    def face_mean(self, vertex_values):
+        sizes = self.face_sizes()
+        sums = self.face_sum(vertex_values[self.indices])
+        return sums / np.maximum(sizes, 1).reshape((-1,) + (1,) * (sums.ndim - 1))
+
+    # Fan-triangulate every face once; returns (T,3) corner positions and the (T,) source faces
+    def triangulate(self):
+        if self.triangle_corners is None:
+            self.triangle_corners, self.triangle_faces = triangulate_faces(self.offsets)
+        return self.triangle_corners, self.triangle_faces
+
+    # Unique (E,2) edges, optionally with how many faces share each one and the edge
+    # running from every corner to the next
+    def edges(self, return_counts=False, return_inverse=False):
+        return extract_edges(self.indices, self.offsets, return_counts, return_inverse)
+
+    # Recompute the packed (F,3) face normals and centroids (once per model)
+    def update_face_attributes(self):
+        self.face_normals, self.face_centroids = compute_face_normals_and_centroids(
+            self.vertices, self.indices, self.offsets)
+
+# Compute packed (F,3) face normals and centroids from CSR face arrays
+def compute_face_normals_and_centroids(vertices, indices, offsets):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    sizes = np.diff(offsets)
+    normals = np.zeros((len(sizes), 3))
+    centroids = np.zeros((len(sizes), 3))
+    if not len(indices):
+        return normals, centroids
+    starts = offsets[:-1]
+
+    # Normal from the first three corners of each polygon
+    polygons = sizes >= 3
+    first = starts[polygons]
+    v1 = vertices[indices[first]]
+    normal = np.cross(vertices[indices[first + 1]] - v1, vertices[indices[first + 2]] - v1)
+    norm = np.linalg.norm(normal, axis=1, keepdims=True)
+    normals[polygons] = np.divide(normal, norm, out=normal, where=norm > 0)
+
+    # Centroid as the mean of every corner
+    non_empty = sizes > 0
+    sums = np.add.reduceat(vertices[indices], starts[non_empty], axis=0)
+    centroids[non_empty] = sums / sizes[non_empty, None]
+    return normals, centroids
+
+# Extract unique undirected edges from CSR face arrays as an (E,2) int array
+def extract_edges(indices, offsets, return_counts=False, return_inverse=False):
+    sizes = np.diff(offsets)
+    # Pair every corner with the next one, wrapping the last corner of each polygon to its first
+    following = np.arange(1, len(indices) + 1)
+    non_empty = sizes > 0
+    following[offsets[1:][non_empty] - 1] = offsets[:-1][non_empty]
+    start = indices.astype(np.int64)
+    end = start[following] if len(indices) else start
+    low, high = np.minimum(start, end), np.maximum(start, end)
+
+    # Pack each pair into one int64 key so np.unique dedups them in a single pass
+    keys = (low << 32) | (high & 0xFFFFFFFF)
+    unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    edges = np.empty((len(unique_keys), 2), dtype=np.int64)
+    edges[:, 0] = unique_keys >> 32
+    edges[:, 1] = unique_keys & 0xFFFFFFFF
+    result = (edges,)
+    if return_counts:
+        result += (counts,)
+    if return_inverse:
+        result += (inverse,)
+    return result if len(result) > 1 else edges
+
+# Boundary edges belong to one face, non-manifold edges to more than two
+def classify_edges(counts):
+    return counts == 1, counts > 2
+
+# Fan-triangulate CSR faces into (T,3) positions in the corner arrays plus each triangle's face
+def triangulate_faces(offsets):
+    sizes = np.diff(offsets)
+    triangle_counts = np.maximum(sizes - 2, 0)
+    faces = np.repeat(np.arange(len(sizes)), triangle_counts)
+    fan_index = np.arange(len(faces)) - np.repeat(np.cumsum(triangle_counts) - triangle_counts, triangle_counts)
+    first = offsets[:-1][faces]
+    corners = np.stack((first, first + fan_index + 1, first + fan_index + 2), axis=1)
+    return corners, faces
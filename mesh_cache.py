@@ -0,0 +1,152 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+from mesh import Mesh
+
+# Cache location and size cap (both overridable through the environment)
+CACHE_DIR = os.environ.get('OBJ_VIEWER_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'obj_viewer'))
+CACHE_MAX_BYTES = int(os.environ.get('OBJ_VIEWER_CACHE_MAX_MB', '2048')) * 1024 * 1024
+
+# File layout: magic, 8-byte header length, JSON header, then 64-byte aligned raw arrays
+MAGIC = b'OBJVCACH'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# Entries are named <path hash>-<kind>-<mtime/size hash>.cache so stale ones can be found by path
+def _path_key(source_path):
+    return hashlib.sha1(os.path.abspath(source_path).encode('utf-8')).hexdigest()[:20]
+
+def _cache_path(source_path, kind, cache_dir):
+    stat = os.stat(source_path)
+    version = hashlib.sha1(f"{stat.st_mtime_ns}|{stat.st_size}|{FORMAT_VERSION}".encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{_path_key(source_path)}-{kind}-{version}.cache")
+
+# Write named arrays plus JSON metadata for a source file
+def store_arrays(source_path, kind, arrays, metadata=None, cache_dir=None, max_bytes=None):
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(source_path, kind, cache_dir)
+    invalidate(source_path, kind, cache_dir)
+
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({'arrays': entries, 'metadata': metadata or {}}).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + entries[name]['offset'])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_start + offset)
+    os.replace(temp_path, path)
+    enforce_size_limit(max_bytes, cache_dir)
+    return path
+
+# Memory-map the cached arrays for a source file, or return None on a miss
+def load_arrays(source_path, kind, cache_dir=None):
+    cache_dir = cache_dir or CACHE_DIR
+    try:
+        path = _cache_path(source_path, kind, cache_dir)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            header_length = int.from_bytes(f.read(8), 'little')
+            header = json.loads(f.read(header_length).decode('utf-8'))
+        data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+        size = os.path.getsize(path)
+        buffer = np.memmap(path, dtype=np.uint8, mode='r') if size > data_start else None
+        arrays = {}
+        for name, entry in header['arrays'].items():
+            dtype = np.dtype(entry['dtype'])
+            count = int(np.prod(entry['shape'], dtype=np.int64))
+            start = data_start + entry['offset']
+            if count == 0:
+                arrays[name] = np.zeros(entry['shape'], dtype=dtype)
+            else:
+                arrays[name] = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(entry['shape'])
+        # Touch the entry so the size cap evicts least recently used files first
+        os.utime(path)
+        return arrays, header['metadata']
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Ignoring unreadable cache entry for '{source_path}': {e}")
+        return None
+
+# Cache a parsed mesh together with its mtllib names
+def save_mesh(source_path, mesh, material_libs, cache_dir=None):
+    arrays = mesh.arrays()
+    metadata = {'material_names': mesh.material_names, 'material_libs': list(material_libs)}
+    return store_arrays(source_path, 'mesh', arrays, metadata, cache_dir)
+
+# Load a cached mesh as (mesh, material_libs), or None on a miss
+def load_mesh(source_path, cache_dir=None):
+    cached = load_arrays(source_path, 'mesh', cache_dir)
+    if cached is None:
+        return None
+    arrays, metadata = cached
+    return Mesh.from_arrays(arrays, metadata['material_names']), metadata['material_libs']
+
+# Remove cache entries for one source file (every kind unless given), or the whole cache
+def invalidate(source_path=None, kind=None, cache_dir=None):
+    cache_dir = cache_dir or CACHE_DIR
+    if source_path is None:
+        pattern = '*.cache'
+    else:
+        pattern = f"{_path_key(source_path)}-{kind or '*'}-*.cache"
+    removed = 0
+    for path in glob.glob(os.path.join(cache_dir, pattern)):
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+# Evict least recently used entries until the cache fits in max_bytes
+def enforce_size_limit(max_bytes=None, cache_dir=None):
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for path in glob.glob(os.path.join(cache_dir, '*.cache')):
+        try:
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        except OSError:
+            pass
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    return total
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manage the binary mesh cache")
+    parser.add_argument('paths', nargs='*', help="Source files whose cache entries should be removed")
+    parser.add_argument('--clear', action='store_true', help="Remove every cache entry")
+    parser.add_argument('--max-mb', type=int, help="Evict least recently used entries down to this size")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="Cache directory")
+    args = parser.parse_args()
+    if args.clear:
+        print(f"Removed {invalidate(cache_dir=args.cache_dir)} cache entries")
+    for source_path in args.paths:
+        print(f"Removed {invalidate(source_path, cache_dir=args.cache_dir)} cache entries for '{source_path}'")
+    if args.max_mb is not None:
+        total = enforce_size_limit(args.max_mb * 1024 * 1024, args.cache_dir)
+        print(f"Cache size: {total / (1024 * 1024):.1f} MB")
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+import numpy as np
+
+# Memory loaded models may hold before the least recently used ones are dropped
+MEMORY_BUDGET_MB = 2048
+
+# Bytes of the NumPy arrays reachable from an object (dicts, lists and object attributes,
+# including __slots__ ones like Mesh's, are followed; arrays sharing a buffer are counted once)
+def model_nbytes(model):
+    total = 0
+    seen = set()
+    pending = [model]
+    while pending:
+        value = pending.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        if isinstance(value, np.ndarray):
+            base = value
+            while isinstance(base.base, np.ndarray):
+                base = base.base
+            if id(base) != id(value) and id(base) in seen:
+                continue
+            seen.add(id(base))
+            total += base.nbytes
+        elif isinstance(value, dict):
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            pending.extend(value)
+        else:
+            if hasattr(value, '__dict__'):
+                pending.extend(vars(value).values())
+            for cls in type(value).__mro__:
+                for name in getattr(cls, '__slots__', ()):
+                    if hasattr(value, name):
+                        pending.append(getattr(value, name))
+    return total
+
+class ModelLibrary:
+    # Lightweight handles for the models to view; each one is loaded on a background thread the
+    # first time it is needed by load(paths), which yields (path, model) as each of a batch of
+    # paths is ready, and dropped again (after unload(model), if given) when the loaded models
+    # run over memory_budget bytes, least recently used first
+    def __init__(self, paths, load, memory_budget=MEMORY_BUDGET_MB * 1024 * 1024, unload=None):
+        self.load = load
+        self.unload = unload
+        self.memory_budget = memory_budget
+        self.lock = threading.Lock()
+        self.current = 0
+        self.handles = [{"path": path, "name": os.path.basename(path) if path else "Default Cube",
+                         "state": "unloaded", "model": None, "last_used": 0.0, "started": 0.0,
+                         "skip_prefetch": False} for path in paths]
+
+    def __len__(self):
+        return len(self.handles)
+
+    def name(self, index):
+        return self.handles[index]["name"]
+
+    # "unloaded", "loading", "ready" or "failed"
+    def state(self, index):
+        return self.handles[index]["state"]
+
+    # Seconds since the model started loading
+    def loading_time(self, index):
+        return time.monotonic() - self.handles[index]["started"]
+
+    # The model to show, or None while it is loading (a load is started when needed, together
+    # with the models at the prefetch indices)
+    def get(self, index, prefetch=()):
+        handle = self.handles[index]
+        if index != self.current:
+            self.current = index
+            self.enforce_budget()
+        handle["last_used"] = time.monotonic()
+        handle["skip_prefetch"] = False
+        if handle["state"] == "unloaded":
+            self._start([handle] + [self.handles[i] for i in prefetch if not self.handles[i]["skip_prefetch"]])
+        return handle["model"] if handle["state"] == "ready" else None
+
+    # Load a model ahead of time unless it was dropped for lack of memory since it was last shown
+    def prefetch(self, index):
+        handle = self.handles[index]
+        if handle["state"] == "unloaded" and not handle["skip_prefetch"]:
+            self._start([handle])
+
+    # Load the unloaded handles among handles as one batch (a path only once per batch)
+    def _start(self, handles):
+        with self.lock:
+            batch = {}
+            for handle in handles:
+                if handle["state"] == "unloaded" and handle["path"] not in batch:
+                    batch[handle["path"]] = handle
+            for handle in batch.values():
+                handle["state"] = "loading"
+                handle["started"] = time.monotonic()
+        if batch:
+            threading.Thread(target=self._load, args=(list(batch.values()),), daemon=True).start()
+
+    def _load(self, handles):
+        by_path = {handle["path"]: handle for handle in handles}
+        try:
+            for path, model in self.load(list(by_path)):
+                with self.lock:
+                    by_path[path]["model"] = model
+                    by_path[path]["state"] = "ready"
+                self.enforce_budget()
+        except Exception as e:
+            for handle in handles:
+                if handle["state"] == "loading":
+                    print(f"Error loading model '{handle['name']}': {e}")
+        # Models the loader didn't return failed
+        with self.lock:
+            for handle in handles:
+                if handle["state"] == "loading":
+                    handle["state"] = "failed"
+
+    # Drop loaded models, least recently used first, until the rest fit the budget; the model
+    # on screen is always kept
+    def enforce_budget(self):
+        with self.lock:
+            ready = [handle for handle in self.handles if handle["state"] == "ready"]
+            sizes = {id(handle): model_nbytes(handle["model"]) for handle in ready}
+            total = sum(sizes.values())
+            current = self.handles[self.current]
+            for handle in sorted(ready, key=lambda handle: handle["last_used"]):
+                if total <= self.memory_budget:
+                    break
+                if handle is current:
+                    continue
+                print(f"Unloading model '{handle['name']}' ({sizes[id(handle)] / (1024 * 1024):.0f} MB) "
+                      f"to stay under the memory budget")
+                handle["skip_prefetch"] = True
+                handle["model"]["evicted"] = True
+                if self.unload:
+                    self.unload(handle["model"])
+                handle["model"] = None
+                handle["state"] = "unloaded"
+                total -= sizes[id(handle)]
+        return total
@@ -1,10 +1,86 @@
+import os
+import threading
 import numpy as np
-import pywavefront
 from OpenGL.GL import *
-from PIL import Image
+import mesh_cache
+from lod import build_index_lods, select_level
+from obj_parser import parse_obj
+from texture import MAX_TEXTURE_SIZE
+from texture_cache import shared_textures
+
+# Attributes of corners without a normal or texture coordinate
+DEFAULT_NORMAL = (0.0, 0.0, 1.0)
+DEFAULT_UV = (0.0, 0.0)
+
+# Distinct values of a 1-D key array numbered in order of first use: returns the position of
+# each one's first use and every element's number
+def first_use(keys):
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], rank[inverse.ravel()]
+
+# Deduplicate (N,8) per-corner rows (position, normal, texcoord) into an interleaved float32
+# vertex buffer and a uint32 index buffer. Vertices are numbered in order of first use, exactly
+# as a dict keyed on the rows would number them
+def interleave_vertices(rows):
+    # Adding 0.0 turns -0.0 into 0.0, which compare equal as keys but differ as bytes
+    rows = np.ascontiguousarray(rows, dtype=np.float64).reshape(-1, 8) + 0.0
+    if not len(rows):
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.uint32)
+    first, numbers = first_use(rows.view(np.dtype((np.void, rows.itemsize * 8))).ravel())
+    return rows[first].astype(np.float32).ravel(), numbers.astype(np.uint32)
+
+# Vertex and index buffers for a parsed mesh's triangles, grouped by material; runs without a GL context
+def build_vertex_buffers(mesh):
+    corners, triangle_faces = mesh.triangulate()
+    valid = np.all((mesh.indices[corners] >= 0) & (mesh.indices[corners] < len(mesh.vertices)), axis=1)
+    corners, triangle_faces = corners[valid], triangle_faces[valid]
+    corners = corners[np.argsort(mesh.material_ids[triangle_faces], kind='stable')].ravel()
+
+    # Corners sharing position, normal and texcoord indices are merged first, cheaply on packed
+    # integer keys, so only the remaining rows are compared by value
+    attributes = []
+    for attribute_indices, values in ((mesh.indices, mesh.vertices), (mesh.normal_indices, mesh.normals),
+                                      (mesh.uv_indices, mesh.uvs)):
+        attribute_indices = attribute_indices[corners].astype(np.int64)
+        attributes.append(np.where((attribute_indices >= 0) & (attribute_indices < len(values)), attribute_indices, -1))
+    bits = [max(len(values), 1).bit_length() + 1 for values in (mesh.vertices, mesh.normals, mesh.uvs)]
+    if sum(bits) <= 63:
+        keys = ((attributes[0] + 1) << (bits[1] + bits[2])) | ((attributes[1] + 1) << bits[2]) | (attributes[2] + 1)
+    else:
+        keys = np.stack(attributes, axis=1).view(np.dtype((np.void, 24))).ravel()
+    first, corner_numbers = first_use(keys)
+
+    rows = np.empty((len(first), 8))
+    rows[:, 0:3] = mesh.vertices[attributes[0][first]]
+    for columns, attribute_indices, values, default in ((slice(3, 6), attributes[1], mesh.normals, DEFAULT_NORMAL),
+                                                        (slice(6, 8), attributes[2], mesh.uvs, DEFAULT_UV)):
+        attribute_indices = attribute_indices[first]
+        present = attribute_indices >= 0
+        rows[:, columns] = default
+        rows[present, columns] = values[attribute_indices[present]]
+    vertices, row_numbers = interleave_vertices(rows)
+    return vertices, row_numbers[corner_numbers]
+
+# Parse an OBJ file into vertex and index buffers, reusing memory-mapped ones from a previous
+# load when the file is unchanged; runs without a GL context
+def load_vertex_buffers(file_path):
+    cached = mesh_cache.load_arrays(file_path, 'model')
+    if cached is not None:
+        arrays, _ = cached
+        return arrays['vertices'], arrays['indices']
+    mesh, _ = parse_obj(file_path)
+    vertices, indices = build_vertex_buffers(mesh)
+    try:
+        mesh_cache.store_arrays(file_path, 'model', {'vertices': vertices, 'indices': indices})
+    except OSError as e:
+        print(f"Could not cache '{file_path}': {e}")
+    return vertices, indices
 
 class Model:
-    def __init__(self, file_path):
+    def __init__(self, file_path, max_texture_size=MAX_TEXTURE_SIZE):
         self.VAO = 0
         self.VBO = 0
         self.EBO = 0
@@ -12,65 +88,56 @@ class Model:
         self.num_vertices = 0
         self.num_indices = 0
         self.has_texture = False
+        self.max_texture_size = max_texture_size
+        # Shared texture cache key while the texture decodes in the background
+        self.pending_texture = None
+        
+        # Level of detail: (element buffer, index count) per level, finest first
+        self.lod_buffers = []
+        self.lod_level = 0
+        self.pending_lods = []
         
         # Load the model
         self.load_model(file_path)
         
     def load_model(self, file_path):
-        # Load OBJ file using PyWavefront
-        scene = pywavefront.Wavefront(file_path, collect_faces=True, parse=True)
-        
-        # Extract vertices, normals, and texture coordinates
-        vertices = []
-        indices = []
-        
-        # Track unique vertices to build index buffer
-        unique_vertices = {}
-        index_count = 0
-        
-        # Process all meshes
-        for name, material in scene.materials.items():
-            for i, face in enumerate(material.faces):
-                for vertex_i in face:
-                    # Get vertex attributes
-                    vertex = scene.vertices[vertex_i]
-                    
-                    # Default values for normal and texture coordinates
-                    normal = [0.0, 0.0, 1.0]
-                    tex_coord = [0.0, 0.0]
-                    
-                    # Extract position (always present)
-                    position = vertex[0:3]
-                    
-                    # Check if normals are present
-                    if len(vertex) >= 6:
-                        normal = vertex[3:6]
-                    
-                    # Check if texture coordinates are present
-                    if len(vertex) >= 8:
-                        tex_coord = vertex[6:8]
-                    
-                    # Create a unique key for this vertex
-                    vertex_key = tuple(position + normal + tex_coord)
-                    
-                    # Check if we've seen this vertex before
-                    if vertex_key in unique_vertices:
-                        # Reuse existing vertex
-                        indices.append(unique_vertices[vertex_key])
-                    else:
-                        # Add new vertex
-                        vertices.extend(position + normal + tex_coord)
-                        unique_vertices[vertex_key] = index_count
-                        indices.append(index_count)
-                        index_count += 1
-        
-        # Convert to numpy arrays
-        vertices = np.array(vertices, dtype=np.float32)
-        indices = np.array(indices, dtype=np.uint32)
+        vertices, indices = load_vertex_buffers(file_path)
         
         self.num_vertices = len(vertices) // 8  # position (3) + normal (3) + texcoord (2)
         self.num_indices = len(indices)
         
+        self.upload_buffers(vertices, indices)
+        self.load_default_texture(file_path)
+        
+        # Simplified index buffers are built in the background and uploaded by draw()
+        self.lod_buffers = [(self.EBO, self.num_indices)]
+        positions = np.asarray(vertices).reshape(-1, 8)[:, :3]
+        threading.Thread(target=self.build_lods, args=(positions, indices), daemon=True).start()
+    
+    def build_lods(self, positions, indices):
+        try:
+            for lod_indices in build_index_lods(positions, indices):
+                self.pending_lods.append(lod_indices)
+        except Exception as e:
+            print(f"Error building levels of detail: {e}")
+    
+    def upload_lods(self):
+        # GL calls stay on the drawing thread; every level shares the vertex buffer
+        while self.pending_lods:
+            lod_indices = self.pending_lods.pop(0)
+            ebo = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, ebo)
+            glBufferData(GL_ARRAY_BUFFER, lod_indices.nbytes, lod_indices, GL_STATIC_DRAW)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            self.lod_buffers.append((ebo, len(lod_indices)))
+    
+    def select_lod(self, screen_radius, frame_time, moving=False):
+        # Pick the level for the model's on-screen radius (pixels) and the last frame time (seconds)
+        face_counts = [count // 3 for _, count in self.lod_buffers]
+        self.lod_level = select_level(face_counts, screen_radius, frame_time, self.lod_level, moving)
+        return self.lod_level
+    
+    def upload_buffers(self, vertices, indices):
         # Create VAO
         self.VAO = glGenVertexArrays(1)
         glBindVertexArray(self.VAO)
@@ -100,27 +167,36 @@ class Model:
         
         # Unbind VAO
         glBindVertexArray(0)
-        
-        # Check for texture files with the same name
-        texture_path = file_path.rsplit('.', 1)[0] + '.png'
-        try:
-            self.load_texture(texture_path)
-            self.has_texture = True
-        except:
-            # Try jpg if png fails
-            try:
-                texture_path = file_path.rsplit('.', 1)[0] + '.jpg'
+    
+    def load_default_texture(self, file_path):
+        # Check for texture files with the same name, png first
+        for extension in ('.png', '.jpg'):
+            texture_path = file_path.rsplit('.', 1)[0] + extension
+            if os.path.exists(texture_path):
                 self.load_texture(texture_path)
-                self.has_texture = True
-            except:
-                print(f"No texture found for {file_path}")
-                self.has_texture = False
+                return
+        print(f"No texture found for {file_path}")
+        self.has_texture = False
     
     def load_texture(self, texture_path):
-        # Load texture using PIL
-        image = Image.open(texture_path)
-        image = image.transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(list(image.getdata()), np.uint8)
+        # Decoded on the shared texture cache's threads; draw() uploads it once ready
+        try:
+            self.pending_texture = shared_textures.request(texture_path, self.max_texture_size)
+        except Exception as e:
+            print(f"Error loading texture '{texture_path}': {e}")
+    
+    def upload_texture(self):
+        key = self.pending_texture
+        if key is None or not shared_textures.ready(key):
+            return
+        self.pending_texture = None
+        try:
+            # Mip chain, top row first (the vertex shader flips v), mapped from the disk cache when possible
+            levels = shared_textures.levels(key)
+        except Exception as e:
+            print(f"Error loading texture '{key[0]}': {e}")
+            shared_textures.release(key)
+            return
         
         # Create texture
         self.texture = glGenTextures(1)
@@ -132,31 +208,36 @@ class Model:
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
         
-        # Upload texture data
-        if image.mode == 'RGB':
-            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, image.width, image.height, 0, GL_RGB, GL_UNSIGNED_BYTE, img_data)
-        elif image.mode == 'RGBA':
-            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, image.width, image.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
         
-        # Generate mipmaps
-        glGenerateMipmap(GL_TEXTURE_2D)
+        # Upload every mip level straight from its buffer (rows are tightly packed)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        pixel_format = GL_RGBA if levels[0].shape[2] == 4 else GL_RGB
+        for level, pixels in enumerate(levels):
+            glTexImage2D(GL_TEXTURE_2D, level, pixel_format, pixels.shape[1], pixels.shape[0], 0, pixel_format,
+                         GL_UNSIGNED_BYTE, pixels)
         
-        # Clean up
+        # Clean up; the driver keeps its own copy, so the cached pixels can go once unused
         glBindTexture(GL_TEXTURE_2D, 0)
+        shared_textures.release(key)
+        self.has_texture = True
     
     def draw(self, shader):
         # Bind texture if available
+        self.upload_texture()
         if self.has_texture:
             glActiveTexture(GL_TEXTURE0)
             glBindTexture(GL_TEXTURE_2D, self.texture)
-            shader.set_int("texture1", 0)
-            shader.set_int("useTexture", 1)
+            shader.set_uniforms({"texture1": 0, "useTexture": 1})
         else:
-            shader.set_int("useTexture", 0)
+            shader.set_uniforms({"useTexture": 0})
         
-        # Draw mesh
+        # Draw mesh at the selected level of detail
+        self.upload_lods()
+        ebo, count = self.lod_buffers[min(self.lod_level, len(self.lod_buffers) - 1)]
         glBindVertexArray(self.VAO)
-        glDrawElements(GL_TRIANGLES, self.num_indices, GL_UNSIGNED_INT, None)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ebo)
+        glDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_INT, None)
         glBindVertexArray(0)
         
         # Unbind texture
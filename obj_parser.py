@@ -0,0 +1,193 @@
+import warnings
+from operator import itemgetter
+import numpy as np
+from mesh import Mesh
+
+# Bytes read per chunk; every chunk is cut at its last newline
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# Record kinds, decided from the first bytes of each line
+KIND_OTHER, KIND_V, KIND_VT, KIND_VN, KIND_F, KIND_USEMTL, KIND_MTLLIB = range(7)
+_SPACE, _TAB, _CR, _NEWLINE = ord(' '), ord('\t'), ord('\r'), ord('\n')
+
+# Parse whitespace separated numbers in one call, or None if the text is malformed
+def _bulk_parse(text, dtype):
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', DeprecationWarning)
+            return np.fromstring(text, dtype=dtype, sep=' ')
+    except (ValueError, DeprecationWarning):
+        return None
+
+# Pick the lines at the given indices (C-level gather instead of a Python loop)
+def _select(lines, line_indices):
+    if len(line_indices) == 0:
+        return []
+    if len(line_indices) == 1:
+        return [lines[line_indices[0]]]
+    return list(itemgetter(*line_indices)(lines))
+
+# Convert a block of 'v'/'vt'/'vn' records into an (N,width) float array
+def _parse_float_block(lines, prefix, width):
+    if not lines:
+        return np.zeros((0, width))
+    # The record prefix never occurs inside a number, so it can be blanked in bulk
+    text = b'\n'.join(lines).replace(prefix, b' ' * len(prefix))
+    values = _bulk_parse(text, np.float64)
+    if values is not None and len(values) == len(lines) * width:
+        return values.reshape(-1, width)
+    # Extra components (w, vertex colors) or odd formatting: parse record by record
+    rows = [line.split()[1:width + 1] for line in lines]
+    rows = [row + [b'0'] * (width - len(row)) for row in rows]
+    return np.array(rows).astype(np.float64)
+
+# Split 'f' records into per-face corner counts and an (C,3) array of raw v/vt/vn fields
+def _parse_face_block(lines):
+    text = b'\n'.join(lines).replace(b'f', b' ')
+    buf = np.frombuffer(text, dtype=np.uint8)
+    is_newline = buf == _NEWLINE
+    is_space = (buf == _SPACE) | (buf == _TAB) | (buf == _CR) | is_newline
+    token_starts = np.flatnonzero(~is_space & np.concatenate(([True], is_space[:-1])))
+    line_ends = np.append(np.flatnonzero(is_newline), len(buf))
+    counts = np.diff(np.searchsorted(token_starts, line_ends), prepend=0)
+    corners = int(counts.sum())
+    fields = np.zeros((corners, 3), dtype=np.int64)
+    if not corners:
+        return counts, fields
+
+    # Every corner shares the layout of the first one (v, v/vt, v//vn or v/vt/vn)
+    first = text[token_starts[0]:].split(None, 1)[0]
+    slashes = first.count(b'/')
+    values = None
+    if text.count(b'/') == corners * slashes:
+        values = _bulk_parse(text.replace(b'//', b'/0/').replace(b'/', b' '), np.int64)
+    if values is not None and len(values) == corners * (slashes + 1):
+        fields[:, :slashes + 1] = values.reshape(corners, slashes + 1)
+        return counts, fields
+
+    # Mixed layouts: fall back to parsing corner by corner
+    row = 0
+    for line in lines:
+        for corner in line.split()[1:]:
+            for column, value in enumerate(corner.split(b'/')[:3]):
+                fields[row, column] = int(value) if value else 0
+            row += 1
+    return counts, fields
+
+# Turn 1-based (or negative relative) OBJ indices into 0-based ones, -1 for missing
+def _resolve_indices(raw, counts_before):
+    resolved = raw - 1
+    relative = raw < 0
+    resolved[relative] = counts_before[relative] + raw[relative]
+    resolved[raw == 0] = -1
+    return resolved
+
+class _ObjParser:
+    def __init__(self):
+        self.vertex_blocks = []
+        self.uv_blocks = []
+        self.normal_blocks = []
+        self.index_blocks = []
+        self.uv_index_blocks = []
+        self.normal_index_blocks = []
+        self.count_blocks = []
+        self.material_blocks = []
+        self.material_names = {}
+        self.material_libs = []
+        self.material_id = -1
+        self.vertex_count = 0
+        self.uv_count = 0
+        self.normal_count = 0
+
+    def feed(self, chunk):
+        # Classify every line from its first three bytes
+        buf = np.frombuffer(chunk, dtype=np.uint8)
+        ends = np.flatnonzero(buf == _NEWLINE)
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        padded = np.concatenate((buf, np.zeros(3, dtype=np.uint8)))
+        c0, c1, c2 = padded[starts], padded[starts + 1], padded[starts + 2]
+        sep1 = (c1 == _SPACE) | (c1 == _TAB)
+        sep2 = (c2 == _SPACE) | (c2 == _TAB)
+        kinds = np.full(len(starts), KIND_OTHER, dtype=np.int8)
+        kinds[(c0 == ord('v')) & sep1] = KIND_V
+        kinds[(c0 == ord('v')) & (c1 == ord('t')) & sep2] = KIND_VT
+        kinds[(c0 == ord('v')) & (c1 == ord('n')) & sep2] = KIND_VN
+        kinds[(c0 == ord('f')) & sep1] = KIND_F
+        kinds[(c0 == ord('u')) & (c1 == ord('s'))] = KIND_USEMTL
+        kinds[(c0 == ord('m')) & (c1 == ord('t'))] = KIND_MTLLIB
+        lines = chunk.split(b'\n')
+
+        # Running attribute counts before each line, for relative indices
+        v_before = self.vertex_count + np.cumsum(kinds == KIND_V) - (kinds == KIND_V)
+        vt_before = self.uv_count + np.cumsum(kinds == KIND_VT) - (kinds == KIND_VT)
+        vn_before = self.normal_count + np.cumsum(kinds == KIND_VN) - (kinds == KIND_VN)
+
+        vertices = _parse_float_block(_select(lines, np.flatnonzero(kinds == KIND_V)), b'v', 3)
+        uvs = _parse_float_block(_select(lines, np.flatnonzero(kinds == KIND_VT)), b'vt', 2)
+        normals = _parse_float_block(_select(lines, np.flatnonzero(kinds == KIND_VN)), b'vn', 3)
+        self.vertex_blocks.append(vertices)
+        self.uv_blocks.append(uvs)
+        self.normal_blocks.append(normals)
+
+        # Material switches are rare, so they are handled line by line
+        material_lines = np.flatnonzero(kinds == KIND_USEMTL)
+        material_ids = [self.material_id]
+        for line_index in material_lines:
+            parts = lines[line_index].split()
+            if parts[0] == b'usemtl' and len(parts) > 1:
+                name = parts[1].decode('utf-8', 'replace')
+                self.material_id = self.material_names.setdefault(name, len(self.material_names))
+            material_ids.append(self.material_id)
+        for line_index in np.flatnonzero(kinds == KIND_MTLLIB):
+            parts = lines[line_index].split()
+            if parts[0] == b'mtllib':
+                self.material_libs.extend(part.decode('utf-8', 'replace') for part in parts[1:])
+
+        face_lines = np.flatnonzero(kinds == KIND_F)
+        if len(face_lines):
+            counts, fields = _parse_face_block(_select(lines, face_lines))
+            self.index_blocks.append(_resolve_indices(fields[:, 0], np.repeat(v_before[face_lines], counts)))
+            self.uv_index_blocks.append(_resolve_indices(fields[:, 1], np.repeat(vt_before[face_lines], counts)))
+            self.normal_index_blocks.append(_resolve_indices(fields[:, 2], np.repeat(vn_before[face_lines], counts)))
+            self.count_blocks.append(counts)
+
+            # Each face takes the last material selected before it
+            selected = np.searchsorted(material_lines, face_lines)
+            self.material_blocks.append(np.asarray(material_ids, dtype=np.int32)[selected])
+
+        self.vertex_count += len(vertices)
+        self.uv_count += len(uvs)
+        self.normal_count += len(normals)
+
+    def finish(self):
+        counts = np.concatenate(self.count_blocks) if self.count_blocks else np.zeros(0, dtype=np.int64)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        def join(blocks, width=None):
+            if not blocks:
+                return np.zeros((0, width)) if width else np.zeros(0, dtype=np.int64)
+            return np.concatenate(blocks)
+        return Mesh(join(self.vertex_blocks, 3), join(self.index_blocks), offsets,
+                    join(self.uv_index_blocks), join(self.uv_blocks, 2),
+                    join(self.material_blocks), list(self.material_names),
+                    join(self.normal_index_blocks), join(self.normal_blocks, 3))
+
+# Parse an OBJ file in large binary chunks, returning the mesh and its mtllib names
+def parse_obj(filename, chunk_size=CHUNK_SIZE):
+    parser = _ObjParser()
+    remainder = b''
+    with open(filename, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            data = remainder + data
+            cut = data.rfind(b'\n') + 1
+            if cut == 0:
+                remainder = data
+                continue
+            remainder = data[cut:]
+            parser.feed(data[:cut])
+    if remainder.strip():
+        parser.feed(remainder + b'\n')
+    return parser.finish(), parser.material_libs
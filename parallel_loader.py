@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+import mesh_cache
+from mesh import Mesh
+from obj_parser import parse_obj
+
+ALIGNMENT = 64
+
+# Cache a parsed mesh if possible; a cache that can't be written only costs the next load time
+def _save_to_cache(path, mesh, material_libs):
+    try:
+        mesh_cache.save_mesh(path, mesh, material_libs)
+    except OSError as e:
+        print(f"Could not cache '{path}': {e}")
+
+# Parse one OBJ file in a worker and publish its arrays through a shared memory block
+def _parse_to_shared_memory(path):
+    start = time.perf_counter()
+    mesh, material_libs = parse_obj(path)
+    elapsed = time.perf_counter() - start
+    _save_to_cache(path, mesh, material_libs)
+
+    layout = {}
+    size = 0
+    for name, array in mesh.arrays().items():
+        layout[name] = (array.dtype.str, array.shape, size)
+        size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        for name, (dtype, shape, offset) in layout.items():
+            np.ndarray(shape, dtype, buffer=block.buf, offset=offset)[...] = getattr(mesh, name)
+    finally:
+        block.close()
+    return block.name, layout, mesh.material_names, material_libs, elapsed
+
+# Copy a worker's arrays out of shared memory and release the block
+def _attach_shared_mesh(block_name, layout, material_names):
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        arrays = {name: np.ndarray(shape, dtype, buffer=block.buf, offset=offset).copy()
+                  for name, (dtype, shape, offset) in layout.items()}
+    finally:
+        block.close()
+        block.unlink()
+    return Mesh.from_arrays(arrays, material_names)
+
+# Worker processes come from a fork server where possible, and are spawned elsewhere. Meshes
+# load on background threads, and forking a process with other threads running can copy
+# locks held by them; the workers only receive paths and send meshes back through shared
+# memory, so they don't need the viewer's state
+def _create_executor(max_workers):
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context(method))
+
+# Load several OBJ files at once, yielding (path, mesh, material_libs, seconds, from_cache)
+# as each one finishes; mesh is None when a file fails to load
+def load_meshes(paths, max_workers=None):
+    pending = []
+    for path in dict.fromkeys(paths):
+        start = time.perf_counter()
+        cached = mesh_cache.load_mesh(path)
+        if cached is None:
+            pending.append(path)
+        else:
+            yield path, cached[0], cached[1], time.perf_counter() - start, True
+
+    # A single file is parsed in-process; starting a pool would only add latency
+    if len(pending) == 1:
+        path = pending[0]
+        try:
+            start = time.perf_counter()
+            mesh, material_libs = parse_obj(path)
+            elapsed = time.perf_counter() - start
+            _save_to_cache(path, mesh, material_libs)
+            yield path, mesh, material_libs, elapsed, False
+        except Exception as e:
+            print(f"Error loading OBJ file '{path}': {e}")
+            yield path, None, None, 0.0, False
+        return
+    if not pending:
+        return
+
+    workers = max_workers or min(len(pending), os.cpu_count() or 1)
+    with _create_executor(workers) as executor:
+        futures = {executor.submit(_parse_to_shared_memory, path): path for path in pending}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                block_name, layout, material_names, material_libs, elapsed = future.result()
+                yield path, _attach_shared_mesh(block_name, layout, material_names), material_libs, elapsed, False
+            except Exception as e:
+                print(f"Error loading OBJ file '{path}': {e}")
+                yield path, None, None, 0.0, False
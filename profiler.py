@@ -0,0 +1,77 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+import numpy as np
+
+# Stages of the main loop in drawing order, as marked on the frame scheduler
+STAGES = ("events", "projection", "culling", "sorting", "faces", "edges", "vertices", "blit",
+          "normals", "highlight", "hud", "flip")
+
+# Frames the rolling percentiles cover, and how often the on-screen summary is recomputed
+PROFILE_WINDOW = 300
+SUMMARY_INTERVAL = 30
+
+# Trace file written while the viewer runs (.json or .jsonl for JSON Lines, anything else for
+# CSV); the --trace option overrides it
+TRACE_PATH = os.environ.get('OBJ_VIEWER_TRACE')
+
+class Profiler:
+    # Rolling per-stage timings and an optional per-frame trace file
+    def __init__(self, trace_path=None, window=PROFILE_WINDOW):
+        self.samples = {stage: deque(maxlen=window) for stage in STAGES + ("frame",)}
+        self.frame = 0
+        self.start = time.perf_counter()
+        self.summary_lines = []
+        self.trace_path = trace_path
+        self.trace_file = None
+        self.trace_writer = None
+        # Rows are written as frames are recorded, so long runs don't hold the trace in memory
+        if trace_path:
+            self.trace_file = open(trace_path, 'w', newline='')
+            if not trace_path.lower().endswith(('.json', '.jsonl')):
+                self.trace_writer = csv.writer(self.trace_file)
+                self.trace_writer.writerow(["frame", "time", "reused", "frame_ms"] + [f"{stage}_ms" for stage in STAGES])
+
+    # Add one frame's {stage: seconds}; reused frames (idle, scene not redrawn) are traced but
+    # only their own stages enter the percentiles, not the frame time
+    def record(self, stage_times, reused=False):
+        total = sum(stage_times.values())
+        for stage, seconds in stage_times.items():
+            if stage in self.samples:
+                self.samples[stage].append(seconds)
+        if not reused:
+            self.samples["frame"].append(total)
+        if self.trace_file:
+            times = [stage_times.get(stage) for stage in STAGES]
+            if self.trace_writer:
+                self.trace_writer.writerow([self.frame, f"{time.perf_counter() - self.start:.6f}", int(reused),
+                                            f"{total * 1000:.3f}"]
+                                           + ["" if t is None else f"{t * 1000:.3f}" for t in times])
+            else:
+                row = {"frame": self.frame, "time": time.perf_counter() - self.start, "reused": reused,
+                       "frame_ms": total * 1000,
+                       "stages_ms": {stage: t * 1000 for stage, t in zip(STAGES, times) if t is not None}}
+                self.trace_file.write(json.dumps(row) + "\n")
+        self.frame += 1
+
+    # {stage: (p50, p95, p99)} in milliseconds over the rolling window
+    def percentiles(self):
+        return {stage: tuple(np.percentile(np.array(samples) * 1000, (50, 95, 99)))
+                for stage, samples in self.samples.items() if samples}
+
+    # Overlay lines, refreshed every SUMMARY_INTERVAL frames so they stay readable
+    def summary(self):
+        if self.frame % SUMMARY_INTERVAL == 1 or not self.summary_lines:
+            stats = self.percentiles()
+            self.summary_lines = ["Stage ms: p50 / p95 / p99"] + [
+                f"{stage}: {p50:.1f} / {p95:.1f} / {p99:.1f}"
+                for stage, (p50, p95, p99) in stats.items()]
+        return self.summary_lines
+
+    def close(self):
+        if self.trace_file:
+            self.trace_file.close()
+            self.trace_file = None
+            print(f"Performance trace written to {self.trace_path}")
@@ -0,0 +1,60 @@
+import numpy as np
+
+# Perspective constants shared by every projection path
+FOCAL_LENGTH = 200
+NEAR_Z = 0.001
+# Depth that culling clips primitives against, so nothing reaches the NEAR_Z clamp
+NEAR_PLANE = 0.1
+
+# Build the viewer rotation (around Y first, then around X) as a 3x3 matrix
+def rotation_matrix(angle_x, angle_y):
+    cos_x, sin_x = np.cos(angle_x), np.sin(angle_x)
+    cos_y, sin_y = np.cos(angle_y), np.sin(angle_y)
+    rot_y = np.array([
+        [cos_y, 0.0, -sin_y],
+        [0.0, 1.0, 0.0],
+        [sin_y, 0.0, cos_y]
+    ])
+    rot_x = np.array([
+        [1.0, 0.0, 0.0],
+        [0.0, cos_x, -sin_x],
+        [0.0, sin_x, cos_x]
+    ])
+    return rot_x @ rot_y
+
+# Build the per-frame model transform (rotation and uniform scale)
+def view_matrix(angle_x, angle_y, scale_factor=1):
+    return rotation_matrix(angle_x, angle_y) * scale_factor
+
+# Transform an (N,3) array of points with a 3x3 matrix
+def transform_points(points, matrix):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    return points @ matrix.T
+
+# Perspective-project view-space points to (N,2) screen coordinates and (N,) depths
+def project_view_points(view_points, translate_x=0, translate_y=0, camera_distance=5,
+                        screen_width=800, screen_height=600):
+    z = view_points[:, 2] + camera_distance
+    z = np.where(z <= 0, NEAR_Z, z)
+    scale = FOCAL_LENGTH / z
+    points_2d = np.empty((len(view_points), 2), dtype=np.int64)
+    points_2d[:, 0] = (view_points[:, 0] * scale).astype(np.int64)
+    points_2d[:, 1] = (view_points[:, 1] * scale).astype(np.int64)
+    points_2d[:, 0] += screen_width // 2 + translate_x
+    points_2d[:, 1] += screen_height // 2 + translate_y
+    return points_2d, z
+
+# Project an (N,3) array of model-space points to screen space in one batch
+def project_points(points, angle_x, angle_y, translate_x=0, translate_y=0, scale_factor=1,
+                   camera_distance=5, screen_width=800, screen_height=600):
+    view_points = transform_points(points, view_matrix(angle_x, angle_y, scale_factor))
+    return project_view_points(view_points, translate_x, translate_y, camera_distance,
+                               screen_width, screen_height)
+
+# Model-space ray (origin, direction) through a screen pixel, inverting project_points
+def screen_ray(screen_x, screen_y, matrix, translate_x=0, translate_y=0, camera_distance=5,
+               screen_width=800, screen_height=600):
+    inverse = np.linalg.inv(matrix)
+    direction = np.array([(screen_x - screen_width // 2 - translate_x) / FOCAL_LENGTH,
+                          (screen_y - screen_height // 2 - translate_y) / FOCAL_LENGTH, 1.0])
+    return inverse @ np.array([0.0, 0.0, -camera_distance]), inverse @ direction
@@ -0,0 +1,255 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pygame
+
+# Upper bound on pixels generated per vectorized batch, to keep temporaries small
+MAX_BATCH_PIXELS = 1 << 22
+
+# Triangles are binned into square screen tiles that are rasterized independently
+TILE_SIZE = 64
+MAX_TILE_FRAGMENTS = 1 << 16
+
+class Framebuffer:
+    def __init__(self, width, height, workers=None):
+        self.width = width
+        self.height = height
+        self.color = np.zeros((height, width, 3), dtype=np.uint8)
+        # One row per pixel, so plotting needs a single flat index array
+        self.pixels = self.color.reshape(-1, 3)
+        # Inverse view depth per pixel: 0 is infinitely far, larger values are closer
+        self.depth = np.zeros((height, width), dtype=np.float32)
+        self.depth_pixels = self.depth.reshape(-1)
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+
+    def clear(self, color):
+        self.color[...] = color[:3]
+        self.depth[...] = 0
+
+    # Push the whole buffer to a surface in one call
+    def present(self, surface):
+        pygame.surfarray.blit_array(surface, self.color.transpose(1, 0, 2))
+
+    # Run one task per tile; tiles cover disjoint pixels, so worker threads never overlap
+    def map_tiles(self, function, tasks):
+        if self.workers <= 1 or len(tasks) <= 1:
+            return [function(task) for task in tasks]
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers)
+        return list(self.executor.map(function, tasks))
+
+# Clip (N,2) line segments to the buffer rectangle (vectorized Liang-Barsky)
+def clip_lines(starts, ends, width, height):
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    # Most segments are fully on screen; only the rest need the clipping math
+    inside = ((starts >= 0) & (ends >= 0)).all(axis=1)
+    inside &= (starts[:, 0] < width) & (ends[:, 0] < width) & (starts[:, 1] < height) & (ends[:, 1] < height)
+    if inside.all():
+        return starts, ends
+    crossing = ~inside
+    clipped_starts, clipped_ends = _clip_crossing_lines(starts[crossing], ends[crossing], width, height)
+    return (np.concatenate((starts[inside], clipped_starts)),
+            np.concatenate((ends[inside], clipped_ends)))
+
+def _clip_crossing_lines(starts, ends, width, height):
+    delta = ends - starts
+    t_enter = np.zeros(len(starts))
+    t_leave = np.ones(len(starts))
+    keep = np.ones(len(starts), dtype=bool)
+    for p, q in ((-delta[:, 0], starts[:, 0]),
+                 (delta[:, 0], width - 1 - starts[:, 0]),
+                 (-delta[:, 1], starts[:, 1]),
+                 (delta[:, 1], height - 1 - starts[:, 1])):
+        keep &= ~((p == 0) & (q < 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = q / p
+        t_enter = np.where(p < 0, np.maximum(t_enter, ratio), t_enter)
+        t_leave = np.where(p > 0, np.minimum(t_leave, ratio), t_leave)
+    keep &= t_enter <= t_leave
+    clipped_starts = starts + delta * t_enter[:, None]
+    clipped_ends = starts + delta * t_leave[:, None]
+    return clipped_starts[keep], clipped_ends[keep]
+
+# Rasterize (N,2) screen-space segments into the framebuffer with vectorized DDA stepping
+def draw_lines(framebuffer, starts, ends, color, thickness=1):
+    starts, ends = clip_lines(starts, ends, framebuffer.width, framebuffer.height)
+    if not len(starts):
+        return
+    delta = ends - starts
+    steps = np.ceil(np.abs(delta).max(axis=1)).astype(np.int64)
+    counts = steps + 1
+    # Lines are split into batches so a frame full of long edges stays within MAX_BATCH_PIXELS
+    cumulative = np.cumsum(counts)
+    first = 0
+    while first < len(counts):
+        done = cumulative[first - 1] if first else 0
+        last = max(int(np.searchsorted(cumulative, done + MAX_BATCH_PIXELS, side='right')), first + 1)
+        _draw_line_batch(framebuffer, starts[first:last], delta[first:last], steps[first:last],
+                         counts[first:last], color, thickness)
+        first = last
+
+def _draw_line_batch(framebuffer, starts, delta, steps, counts, color, thickness):
+    if not len(starts):
+        return
+    line_ids = np.repeat(np.arange(len(counts)), counts)
+    step_index = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    fraction = step_index / np.maximum(steps, 1)[line_ids]
+    xs = np.rint(starts[line_ids, 0] + delta[line_ids, 0] * fraction).astype(np.int64)
+    ys = np.rint(starts[line_ids, 1] + delta[line_ids, 1] * fraction).astype(np.int64)
+    # Thicken along the minor axis of each line
+    mostly_horizontal = (np.abs(delta[:, 0]) >= np.abs(delta[:, 1]))[line_ids]
+    for offset in range(thickness):
+        _plot(framebuffer, xs + offset * ~mostly_horizontal, ys + offset * mostly_horizontal, color)
+
+# Stamp a filled disk of the given radius at every (N,2) point
+def draw_points(framebuffer, points, color, radius=3):
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    disk = dx * dx + dy * dy <= radius * radius
+    dx, dy = dx[disk], dy[disk]
+    batch = max(1, MAX_BATCH_PIXELS // len(dx))
+    for first in range(0, len(points), batch):
+        chunk = points[first:first + batch]
+        _plot(framebuffer, (chunk[:, 0, None] + dx).ravel(), (chunk[:, 1, None] + dy).ravel(), color)
+
+def _plot(framebuffer, xs, ys, color):
+    inside = (xs >= 0) & (xs < framebuffer.width) & (ys >= 0) & (ys < framebuffer.height)
+    framebuffer.pixels[ys[inside] * framebuffer.width + xs[inside]] = color[:3]
+
+# Z-buffered rasterization of (T,3) vertex-index triangles with one (T,3) uint8 color each;
+# triangles with a texture id >= 0 are instead sampled from a TextureSet at their (T,3,2) UVs
+def draw_triangles(framebuffer, points, depths, triangles, colors, uvs=None, texture_ids=None, textures=None):
+    width, height = framebuffer.width, framebuffer.height
+    xy = points[triangles].astype(np.float64)
+    low = np.floor(xy.min(axis=1)).astype(np.int64)
+    high = np.ceil(xy.max(axis=1)).astype(np.int64)
+    edges = _edge_functions(xy)
+    visible = ((edges[3] != 0) & (high[:, 0] >= 0) & (high[:, 1] >= 0)
+               & (low[:, 0] < width) & (low[:, 1] < height))
+    visible = np.flatnonzero(visible)
+    if not len(visible):
+        return
+    low = np.maximum(low[visible], 0)
+    high = np.minimum(high[visible], [width - 1, height - 1])
+    (a, b, c), area = [coefficient[visible] for coefficient in edges[:3]], edges[3][visible]
+
+    # Inverse depth is linear in screen space: depth(x, y) = da * x + db * y + dc
+    inv_z = 1.0 / depths[triangles[visible]]
+    plane = np.stack([(coefficient * inv_z).sum(axis=1) / area for coefficient in (a, b, c)], axis=1)
+    triangle_colors = np.asarray(colors, dtype=np.uint8)[visible]
+    texturing = None
+    if textures is not None and len(textures):
+        texturing = _texture_planes(area, (a, b, c), inv_z, uvs[visible], texture_ids[visible], textures)
+
+    # Bin every triangle into each tile its bounding box touches
+    tile_low, tile_high = low // TILE_SIZE, high // TILE_SIZE
+    span = tile_high - tile_low + 1
+    counts = span[:, 0] * span[:, 1]
+    binned = np.repeat(np.arange(len(visible)), counts)
+    local = np.arange(len(binned)) - np.repeat(np.cumsum(counts) - counts, counts)
+    tile_x = tile_low[binned, 0] + local % span[binned, 0]
+    tile_y = tile_low[binned, 1] + local // span[binned, 0]
+    tiles_across = -(-width // TILE_SIZE)
+    tile_ids = tile_y * tiles_across + tile_x
+    order = np.argsort(tile_ids, kind='stable')
+    tile_ids, binned = tile_ids[order], binned[order]
+    splits = np.flatnonzero(np.diff(tile_ids)) + 1
+    tasks = [(int(group_tiles[0]), group) for group_tiles, group in
+             zip(np.split(tile_ids, splits), np.split(binned, splits))]
+
+    def rasterize(task):
+        tile_id, tile_triangles = task
+        tile_left = (tile_id % tiles_across) * TILE_SIZE
+        tile_top = (tile_id // tiles_across) * TILE_SIZE
+        box_low = np.maximum(low[tile_triangles], [tile_left, tile_top])
+        box_high = np.minimum(high[tile_triangles], [tile_left + TILE_SIZE - 1, tile_top + TILE_SIZE - 1])
+        rows = box_high[:, 1] - box_low[:, 1] + 1
+        # Bound the temporaries by the number of bounding-box pixels per batch
+        cumulative = np.cumsum(rows * (box_high[:, 0] - box_low[:, 0] + 1))
+        first = 0
+        while first < len(tile_triangles):
+            done = cumulative[first - 1] if first else 0
+            last = max(int(np.searchsorted(cumulative, done + MAX_TILE_FRAGMENTS, side='right')), first + 1)
+            batch = tile_triangles[first:last]
+            batch_texturing = None
+            if texturing is not None:
+                batch_texturing = tuple(values[batch] for values in texturing) + (textures,)
+            _rasterize_spans(framebuffer, box_low[first:last], box_high[first:last], rows[first:last],
+                             a[batch], b[batch], c[batch], plane[batch], triangle_colors[batch],
+                             batch_texturing)
+            first = last
+    framebuffer.map_tiles(rasterize, tasks)
+
+# Per-triangle texturing state: texture ids, mip levels and the screen-space planes of
+# u / z and v / z, which (divided by the inverse depth) give perspective-correct UVs
+def _texture_planes(area, coefficients, inv_z, uvs, texture_ids, textures):
+    texture_ids = np.asarray(texture_ids, dtype=np.int64)
+    textured = texture_ids >= 0
+    safe_ids = np.where(textured, texture_ids, 0)
+    planes = [np.stack([(coefficient * inv_z * uvs[:, :, axis]).sum(axis=1) / area
+                        for coefficient in coefficients], axis=1) for axis in (0, 1)]
+    # One mip level per triangle, from its texel footprint relative to its screen area
+    uv_edges = uvs[:, 1:] - uvs[:, :1]
+    uv_area = np.abs(uv_edges[:, 0, 0] * uv_edges[:, 1, 1] - uv_edges[:, 0, 1] * uv_edges[:, 1, 0])
+    texel_area = uv_area * textures.widths[safe_ids, 0] * textures.heights[safe_ids, 0]
+    levels = textures.select_levels(safe_ids, texel_area, area)
+    return texture_ids, levels, planes[0], planes[1]
+
+# Edge functions w(x, y) = A * x + B * y + C of each triangle edge, as (T,3) A, B and C arrays
+# plus twice the unsigned area; signs are flipped so inside is w >= 0 for either winding
+def _edge_functions(xy):
+    start = xy
+    end = np.roll(xy, -1, axis=1)
+    # Edge i runs opposite vertex i, so its value weights that vertex barycentrically
+    start, end = np.roll(start, -1, axis=1), np.roll(end, -1, axis=1)
+    a = start[:, :, 1] - end[:, :, 1]
+    b = end[:, :, 0] - start[:, :, 0]
+    c = -(a * start[:, :, 0] + b * start[:, :, 1])
+    area = a[:, 0] * xy[:, 0, 0] + b[:, 0] * xy[:, 0, 1] + c[:, 0]
+    sign = np.where(area < 0, -1.0, 1.0)[:, None]
+    return a * sign, b * sign, c * sign, np.abs(area)
+
+# Walk each triangle row by row: the covered span comes straight from the three edge
+# functions, so only covered pixels become fragments
+def _rasterize_spans(framebuffer, box_low, box_high, rows, a, b, c, plane, colors, texturing=None):
+    row_triangle = np.repeat(np.arange(len(rows)), rows)
+    y = box_low[row_triangle, 1] + np.arange(len(row_triangle)) - np.repeat(np.cumsum(rows) - rows, rows)
+    span_start = box_low[row_triangle, 0].astype(np.float64)
+    span_end = box_high[row_triangle, 0].astype(np.float64)
+    for edge in range(3):
+        slope = a[row_triangle, edge]
+        offset = b[row_triangle, edge] * y + c[row_triangle, edge]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing = -offset / slope
+        span_start = np.where(slope > 0, np.maximum(span_start, np.ceil(crossing - 1e-9)), span_start)
+        span_end = np.where(slope < 0, np.minimum(span_end, np.floor(crossing + 1e-9)), span_end)
+        span_end = np.where((slope == 0) & (offset < 0), span_start - 1, span_end)
+    lengths = np.maximum(span_end - span_start + 1, 0).astype(np.int64)
+    if not lengths.any():
+        return
+
+    span = np.repeat(np.arange(len(lengths)), lengths)
+    x = span_start.astype(np.int64)[span] + np.arange(len(span)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    y = y[span]
+    triangle = row_triangle[span]
+    inv_depth = plane[triangle, 0] * x + plane[triangle, 1] * y + plane[triangle, 2]
+    depth = inv_depth.astype(np.float32)
+    pixel = y * framebuffer.width + x
+
+    # Scatter-max resolves overlapping fragments; those that match the result are visible
+    np.maximum.at(framebuffer.depth_pixels, pixel, depth)
+    visible = np.flatnonzero(depth >= framebuffer.depth_pixels[pixel])
+    triangle = triangle[visible]
+    fragment_colors = colors[triangle]
+    if texturing is not None:
+        texture_ids, levels, u_plane, v_plane, textures = texturing
+        textured = np.flatnonzero(texture_ids[triangle] >= 0)
+        if len(textured):
+            t, fragment = triangle[textured], visible[textured]
+            x, y, inv_depth = x[fragment], y[fragment], inv_depth[fragment]
+            u = (u_plane[t, 0] * x + u_plane[t, 1] * y + u_plane[t, 2]) / inv_depth
+            v = (v_plane[t, 0] * x + v_plane[t, 1] * y + v_plane[t, 2]) / inv_depth
+            fragment_colors[textured] = textures.sample(texture_ids[t], levels[t], u, v)
+    framebuffer.pixels[pixel[visible]] = fragment_colors
@@ -0,0 +1,83 @@
+import os
+import time
+from collections import deque
+
+# Quality steps from full quality down; every step keeps the reductions of the ones before it
+QUALITY_STEPS = ("full", "no vertices", "no normals", "wireframe", "coarsest LOD", "points")
+(QUALITY_FULL, QUALITY_NO_VERTICES, QUALITY_NO_NORMALS, QUALITY_WIREFRAME,
+ QUALITY_COARSEST_LOD, QUALITY_POINTS) = range(len(QUALITY_STEPS))
+
+# Budget per frame (OBJ_VIEWER_TARGET_FPS=0 keeps full quality), and the fraction of it the
+# rolling frame time must stay under before quality is raised again
+TARGET_FPS = float(os.environ.get('OBJ_VIEWER_TARGET_FPS', '30'))
+TARGET_FRAME_TIME = 1 / TARGET_FPS if TARGET_FPS > 0 else float('inf')
+RESTORE_FRACTION = 0.5
+
+# Frames averaged before lowering quality, frames of headroom needed before raising it, and
+# the cap on that wait, which doubles whenever a raise has to be undone straight away
+DEGRADE_FRAMES = 3
+RESTORE_FRAMES = 15
+MAX_RESTORE_FRAMES = 240
+
+class FrameScheduler:
+    def __init__(self, target_frame_time=TARGET_FRAME_TIME):
+        self.target_frame_time = target_frame_time
+        self.frame_times = deque(maxlen=MAX_RESTORE_FRAMES)
+        self.frame_time = 0.0
+        self.stage_times = {}
+        self.frame_stages = {}
+        self.quality = QUALITY_FULL
+        self.restore_frames = RESTORE_FRAMES
+        self.frames_since_change = 0
+        self.last_change = None
+        self.frame_start = self.stage_start = time.perf_counter()
+
+    @property
+    def quality_name(self):
+        return QUALITY_STEPS[self.quality]
+
+    def start_frame(self):
+        self.frame_start = self.stage_start = time.perf_counter()
+        self.stage_times = {}
+
+    # Charge the time since the previous mark to a stage (stages may be marked repeatedly)
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stage_times[stage] = self.stage_times.get(stage, 0.0) + now - self.stage_start
+        self.stage_start = now
+
+    # Average of the last `frames` frame times
+    def rolling_frame_time(self, frames):
+        recent = list(self.frame_times)[-frames:]
+        return sum(recent) / len(recent) if recent else 0.0
+
+    # Close the frame, then lower quality one step when the rolling frame time is over budget,
+    # or raise it one step after enough frames with headroom
+    def end_frame(self):
+        self.frame_time = time.perf_counter() - self.frame_start
+        self.frame_times.append(self.frame_time)
+        self.frame_stages = dict(self.stage_times)
+        self.frames_since_change += 1
+        if (self.quality < len(QUALITY_STEPS) - 1 and self.frames_since_change >= DEGRADE_FRAMES
+                and self.rolling_frame_time(DEGRADE_FRAMES) > self.target_frame_time):
+            if self.last_change == "raise" and self.frames_since_change < RESTORE_FRAMES:
+                self.restore_frames = min(self.restore_frames * 2, MAX_RESTORE_FRAMES)
+            self._change(1, "lower")
+        elif (self.quality > QUALITY_FULL and self.frames_since_change >= self.restore_frames
+                and self.rolling_frame_time(self.restore_frames) < self.target_frame_time * RESTORE_FRACTION):
+            self._change(-1, "raise")
+        elif self.frames_since_change >= MAX_RESTORE_FRAMES:
+            self.restore_frames = RESTORE_FRAMES
+        return self.frame_time
+
+    # Nothing on screen is moving, so frame time no longer matters: raise quality one step
+    # without waiting for headroom
+    def idle(self):
+        if self.quality > QUALITY_FULL:
+            self._change(-1, "idle")
+
+    def _change(self, step, kind):
+        self.quality += step
+        self.last_change = kind
+        self.frames_since_change = 0
+        self.frame_times.clear()
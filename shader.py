@@ -1,46 +1,200 @@
-from OpenGL.GL import *
-import OpenGL.GL.shaders as shaders
+import hashlib
+import time
 import numpy as np
+import OpenGL.GL
+import mesh_cache
+
+# Linked programs are cached in the mesh cache under the vertex shader's path
+PROGRAM_CACHE_KIND = 'program'
+
+# Cache key of a program: its sources and the driver that compiled it, since a binary only
+# loads on the same driver
+def program_cache_key(vertex_src, fragment_src, driver):
+    digest = hashlib.sha1()
+    for part in (vertex_src, fragment_src, driver):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
 
 class Shader:
-    def __init__(self, vertex_path, fragment_path):
+    # gl is the module the GL calls go through (PyOpenGL's by default), so a stand-in can be
+    # passed where there is no GPU. The linked program comes from the program binary cache
+    # when it holds one for these sources and this driver
+    def __init__(self, vertex_path, fragment_path, gl=OpenGL.GL, cache_dir=None):
+        self.gl = gl
         self.program = None
+        self.cache_dir = cache_dir
+        start = time.perf_counter()
         
         # Read vertex shader code
         with open(vertex_path, 'r') as f:
             vertex_src = f.read()
-            
+        
         # Read fragment shader code
         with open(fragment_path, 'r') as f:
             fragment_src = f.read()
-            
-        # Compile shaders
-        vertex_shader = shaders.compileShader(vertex_src, GL_VERTEX_SHADER)
-        fragment_shader = shaders.compileShader(fragment_src, GL_FRAGMENT_SHADER)
         
-        # Create shader program
-        self.program = shaders.compileProgram(vertex_shader, fragment_shader)
+        # Reuse the cached program binary, or compile shaders and create the shader program
+        key = program_cache_key(vertex_src, fragment_src, self.driver())
+        self.program = self.load_program_binary(vertex_path, key)
+        self.from_cache = self.program is not None
+        if not self.from_cache:
+            vertex_shader = self.compile_shader(vertex_src, gl.GL_VERTEX_SHADER)
+            fragment_shader = self.compile_shader(fragment_src, gl.GL_FRAGMENT_SHADER)
+            self.program = self.link_program(vertex_shader, fragment_shader)
+            self.save_program_binary(vertex_path, key)
+        
+        # Seconds spent getting the program ready
+        self.startup_time = time.perf_counter() - start
+        source = "binary cache" if self.from_cache else "compiled"
+        print(f"Shader program ready in {self.startup_time * 1000:.1f} ms ({source})")
+        
+        # Active uniforms, found once: {name: (location, type)}, and the last value uploaded
+        # to every location
+        self.uniforms = self.find_uniforms()
+        self.values = {}
+        
+    def compile_shader(self, source, shader_type):
+        gl = self.gl
+        shader = gl.glCreateShader(shader_type)
+        gl.glShaderSource(shader, source)
+        gl.glCompileShader(shader)
+        if not gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS):
+            raise RuntimeError(f"Shader compile failure: {gl.glGetShaderInfoLog(shader)}")
+        return shader
+        
+    def link_program(self, *shaders):
+        gl = self.gl
+        program = gl.glCreateProgram()
+        for shader in shaders:
+            gl.glAttachShader(program, shader)
+        # Ask the driver to keep the binary retrievable for the program cache
+        try:
+            gl.glProgramParameteri(program, gl.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, gl.GL_TRUE)
+        except Exception:
+            pass
+        gl.glLinkProgram(program)
+        if not gl.glGetProgramiv(program, gl.GL_LINK_STATUS):
+            raise RuntimeError(f"Shader link failure: {gl.glGetProgramInfoLog(program)}")
+        for shader in shaders:
+            gl.glDeleteShader(shader)
+        return program
+        
+    # Vendor, renderer and version strings of the current GL context
+    def driver(self):
+        gl = self.gl
+        strings = []
+        for name in (gl.GL_VENDOR, gl.GL_RENDERER, gl.GL_VERSION):
+            value = gl.glGetString(name) or b''
+            strings.append(value.decode('utf-8', 'replace') if isinstance(value, bytes) else str(value))
+        return '|'.join(strings)
+        
+    # Program linked from the cached binary, or None when there is none or the driver rejects it
+    def load_program_binary(self, vertex_path, key):
+        gl = self.gl
+        cached = mesh_cache.load_arrays(vertex_path, PROGRAM_CACHE_KIND, self.cache_dir)
+        if cached is None:
+            return None
+        arrays, metadata = cached
+        if metadata.get('key') != key:
+            return None
+        binary = np.ascontiguousarray(arrays['binary'])
+        program = gl.glCreateProgram()
+        try:
+            gl.glProgramBinary(program, metadata['format'], binary, len(binary))
+            if gl.glGetProgramiv(program, gl.GL_LINK_STATUS):
+                return program
+        except Exception as e:
+            print(f"Error loading cached shader program: {e}")
+        # Rejected (usually after a driver update): compile from source and cache again
+        gl.glDeleteProgram(program)
+        return None
+        
+    # Store the linked program's binary, where the driver supports program binaries
+    def save_program_binary(self, vertex_path, key):
+        gl = self.gl
+        try:
+            if not gl.glGetIntegerv(gl.GL_NUM_PROGRAM_BINARY_FORMATS):
+                return
+            length = gl.glGetProgramiv(self.program, gl.GL_PROGRAM_BINARY_LENGTH)
+            binary = np.zeros(length, dtype=np.uint8)
+            written = np.zeros(1, dtype=np.int32)
+            binary_format = np.zeros(1, dtype=np.uint32)
+            gl.glGetProgramBinary(self.program, length, written, binary_format, binary)
+            mesh_cache.store_arrays(vertex_path, PROGRAM_CACHE_KIND, {'binary': binary[:written[0]]},
+                                    {'key': key, 'format': int(binary_format[0])}, self.cache_dir)
+        except Exception as e:
+            print(f"Could not cache shader program: {e}")
+        
+    # Location and type of every active uniform; arrays are found under both "name" and "name[0]"
+    def find_uniforms(self):
+        gl = self.gl
+        uniforms = {}
+        for index in range(gl.glGetProgramiv(self.program, gl.GL_ACTIVE_UNIFORMS)):
+            name, size, uniform_type = gl.glGetActiveUniform(self.program, index)
+            name = name.decode() if isinstance(name, bytes) else name
+            location = gl.glGetUniformLocation(self.program, name)
+            uniforms[name] = (location, uniform_type)
+            if name.endswith('[0]'):
+                uniforms[name[:-3]] = (location, uniform_type)
+        return uniforms
         
     def use(self):
-        glUseProgram(self.program)
+        self.gl.glUseProgram(self.program)
+        
+    # Cached location of a uniform (-1 when the program doesn't use it)
+    def location(self, name):
+        if name not in self.uniforms:
+            self.uniforms[name] = (self.gl.glGetUniformLocation(self.program, name), None)
+        return self.uniforms[name][0]
+        
+    # Location to upload value to, or None when the uniform is unused or already holds value
+    def changed(self, name, value):
+        location = self.location(name)
+        if location == -1 or self.values.get(location) == value:
+            return None
+        self.values[location] = value
+        return location
         
     def set_bool(self, name, value):
-        glUniform1i(glGetUniformLocation(self.program, name), int(value))
+        self.set_int(name, int(value))
         
     def set_int(self, name, value):
-        glUniform1i(glGetUniformLocation(self.program, name), value)
+        location = self.changed(name, int(value))
+        if location is not None:
+            self.gl.glUniform1i(location, int(value))
         
     def set_float(self, name, value):
-        glUniform1f(glGetUniformLocation(self.program, name), value)
+        location = self.changed(name, float(value))
+        if location is not None:
+            self.gl.glUniform1f(location, float(value))
+        
+    # Vectors and matrices are compared by their float32 bytes
+    def set_floats(self, name, value, upload):
+        data = np.ascontiguousarray(value, dtype=np.float32)
+        location = self.changed(name, data.tobytes())
+        if location is not None:
+            upload(location, data)
         
     def set_vec2(self, name, value):
-        glUniform2fv(glGetUniformLocation(self.program, name), 1, value)
+        self.set_floats(name, value, lambda location, data: self.gl.glUniform2fv(location, 1, data))
         
     def set_vec3(self, name, value):
-        glUniform3fv(glGetUniformLocation(self.program, name), 1, value)
+        self.set_floats(name, value, lambda location, data: self.gl.glUniform3fv(location, 1, data))
         
     def set_vec4(self, name, value):
-        glUniform4fv(glGetUniformLocation(self.program, name), 1, value)
+        self.set_floats(name, value, lambda location, data: self.gl.glUniform4fv(location, 1, data))
         
     def set_mat4(self, name, value):
-        glUniformMatrix4fv(glGetUniformLocation(self.program, name), 1, GL_FALSE, value)
\ No newline at end of file
+        self.set_floats(name, value, lambda location, data: self.gl.glUniformMatrix4fv(location, 1, self.gl.GL_FALSE, data))
+        
+    # Upload a frame's uniforms at once from {name: value}, each with the setter matching the
+    # type the shader declares (unused names are skipped)
+    def set_uniforms(self, values):
+        gl = self.gl
+        setters = {gl.GL_FLOAT_MAT4: self.set_mat4, gl.GL_FLOAT_VEC4: self.set_vec4, gl.GL_FLOAT_VEC3: self.set_vec3,
+                   gl.GL_FLOAT_VEC2: self.set_vec2, gl.GL_FLOAT: self.set_float, gl.GL_BOOL: self.set_bool}
+        for name, value in values.items():
+            location = self.location(name)
+            if location != -1:
+                setters.get(self.uniforms[name][1], self.set_int)(name, value)
\ No newline at end of file
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import mesh_cache
+from model_loader import DEFAULT_NORMAL, DEFAULT_UV, build_vertex_buffers, interleave_vertices, load_vertex_buffers
+from obj_parser import parse_obj
+
+# Shared corners, faces without texture coordinates or normals, a quad and a pentagon, and
+# materials that alternate so faces have to be regrouped
+OBJ_SOURCE = """v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+v 0.5 1.5 0
+v 0.5 0.5 1
+vt 0 0
+vt 1 0
+vt 1 1
+vt 0 1
+vn 0 0 1
+vn 0 0 -1
+usemtl red
+f 1/1/1 2/2/1 3/3/1 4/4/1
+usemtl blue
+f 1//2 3//2 6//2
+usemtl red
+f 1/1 2/2 6/3
+f 2 3 6
+usemtl blue
+f 1/1/1 2/2/1 3/3/1 5/4/1 4/4/1
+f 4/4/1 3/3/1 5/1/1
+"""
+
+# The per-corner loop the vectorized buffers replaced: triangles grouped by material, and
+# each distinct (position, normal, texcoord) row numbered the first time it is used
+def reference_vertex_buffers(mesh):
+    corners, triangle_faces = mesh.triangulate()
+    order = np.argsort(mesh.material_ids[triangle_faces], kind='stable')
+    vertices = []
+    indices = []
+    unique_vertices = {}
+    for corner in corners[order].ravel().tolist():
+        position = mesh.vertices[mesh.indices[corner]].tolist()
+        normal_index = mesh.normal_indices[corner]
+        uv_index = mesh.uv_indices[corner]
+        normal = mesh.normals[normal_index].tolist() if 0 <= normal_index < len(mesh.normals) else list(DEFAULT_NORMAL)
+        uv = mesh.uvs[uv_index].tolist() if 0 <= uv_index < len(mesh.uvs) else list(DEFAULT_UV)
+        key = tuple(position + normal + uv)
+        if key not in unique_vertices:
+            unique_vertices[key] = len(unique_vertices)
+            vertices.extend(key)
+        indices.append(unique_vertices[key])
+    return np.array(vertices, dtype=np.float32), np.array(indices, dtype=np.uint32)
+
+class VertexBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'mesh.obj')
+        with open(self.path, 'w') as f:
+            f.write(OBJ_SOURCE)
+        self.mesh, _ = parse_obj(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_matches_reference_loop(self):
+        vertices, indices = build_vertex_buffers(self.mesh)
+        expected_vertices, expected_indices = reference_vertex_buffers(self.mesh)
+        self.assertEqual(vertices.dtype, np.float32)
+        self.assertEqual(indices.dtype, np.uint32)
+        np.testing.assert_array_equal(vertices, expected_vertices)
+        np.testing.assert_array_equal(indices, expected_indices)
+
+    def test_shared_corners_merged(self):
+        vertices, indices = build_vertex_buffers(self.mesh)
+        self.assertLess(len(vertices) // 8, len(indices))
+        self.assertEqual(int(indices.max()) + 1, len(vertices) // 8)
+
+    def test_interleave_numbers_in_first_use_order(self):
+        rows = np.array([[1, 0, 0, 0, 0, 1, 0, 0], [0, 0, 0, 0, 0, 1, 0, 0], [1, 0, 0, 0, 0, 1, 0, 0],
+                         [-0.0, 0, 0, 0, 0, 1, 0, 0]])
+        vertices, indices = interleave_vertices(rows)
+        np.testing.assert_array_equal(indices, [0, 1, 0, 1])
+        np.testing.assert_array_equal(vertices.reshape(-1, 8), rows[:2])
+
+    def test_unwritable_cache(self):
+        unwritable = os.path.join(os.devnull, 'cache')
+        with mock.patch.object(mesh_cache, 'CACHE_DIR', unwritable):
+            vertices, indices = load_vertex_buffers(self.path)
+        np.testing.assert_array_equal(indices, build_vertex_buffers(self.mesh)[1])
+
+if __name__ == '__main__':
+    unittest.main()
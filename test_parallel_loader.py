@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import mesh_cache
+from parallel_loader import load_meshes
+
+# A cache directory that can never be created
+UNWRITABLE_CACHE_DIR = os.path.join(os.devnull, 'cache')
+
+OBJ_SOURCE = """v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+f 1 2 3 4
+f 1 3 4
+"""
+
+class UnwritableCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for name in ('first.obj', 'second.obj'):
+            path = os.path.join(self.directory, name)
+            with open(path, 'w') as f:
+                f.write(OBJ_SOURCE)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def load(self, paths):
+        # Workers read the cache location from the environment when they import mesh_cache
+        with mock.patch.dict(os.environ, {'OBJ_VIEWER_CACHE_DIR': UNWRITABLE_CACHE_DIR}), \
+                mock.patch.object(mesh_cache, 'CACHE_DIR', UNWRITABLE_CACHE_DIR):
+            return {path: mesh for path, mesh, _, _, _ in load_meshes(paths)}
+
+    def test_single_file_still_loads(self):
+        meshes = self.load(self.paths[:1])
+        mesh = meshes[self.paths[0]]
+        self.assertIsNotNone(mesh)
+        self.assertEqual(len(mesh.vertices), 4)
+        self.assertEqual(mesh.face_count, 2)
+
+    def test_worker_processes_still_load(self):
+        meshes = self.load(self.paths)
+        for path in self.paths:
+            self.assertIsNotNone(meshes[path])
+            self.assertEqual(meshes[path].face_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import OpenGL.GL
+from shader import Shader, program_cache_key
+
+VERTEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shadersvertex.glsl.txt')
+FRAGMENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shadersfragment.glsl.txt')
+
+# Stand-in for the GL module: records every call and reports a fixed set of active uniforms
+class FakeGL:
+    def __init__(self, uniforms, renderer=b'Renderer', accept_binary=True):
+        for name in dir(OpenGL.GL):
+            if name.startswith('GL_'):
+                setattr(self, name, getattr(OpenGL.GL, name))
+        self.active = uniforms
+        self.renderer = renderer
+        self.accept_binary = accept_binary
+        self.binary_loaded = None
+        self.calls = []
+
+    def names(self):
+        return [call[0] for call in self.calls]
+
+    def __getattr__(self, name):
+        def call(*args):
+            self.calls.append((name,) + args)
+        return call
+
+    def glGetString(self, name):
+        return {self.GL_VENDOR: b'Vendor', self.GL_RENDERER: self.renderer, self.GL_VERSION: b'4.6'}[name]
+
+    def glCreateShader(self, shader_type):
+        self.calls.append(('glCreateShader', shader_type))
+        return 1
+
+    def glCompileShader(self, shader):
+        self.calls.append(('glCompileShader', shader))
+
+    def glGetShaderiv(self, shader, name):
+        return 1
+
+    def glCreateProgram(self):
+        self.calls.append(('glCreateProgram',))
+        return 3
+
+    def glGetProgramiv(self, program, name):
+        if name == self.GL_LINK_STATUS:
+            # A loaded binary links only if the driver accepts it
+            status = 1 if self.binary_loaded is None else int(self.binary_loaded)
+            self.binary_loaded = None
+            return status
+        if name == self.GL_ACTIVE_UNIFORMS:
+            return len(self.active)
+        if name == self.GL_PROGRAM_BINARY_LENGTH:
+            return 16
+        return 0
+
+    def glGetActiveUniform(self, program, index):
+        name, uniform_type = self.active[index]
+        return name.encode(), 1, uniform_type
+
+    def glGetUniformLocation(self, program, name):
+        self.calls.append(('glGetUniformLocation', name))
+        names = [active for active, _ in self.active]
+        return names.index(name) if name in names else -1
+
+    def glGetIntegerv(self, name):
+        return 1
+
+    def glGetProgramBinary(self, program, length, written, binary_format, binary):
+        binary[:4] = np.frombuffer(b'BIN!', dtype=np.uint8)
+        written[0] = 4
+        binary_format[0] = 77
+
+    def glProgramBinary(self, program, binary_format, binary, length):
+        self.calls.append(('glProgramBinary', binary_format, bytes(binary)))
+        self.binary_loaded = self.accept_binary and bytes(binary) == b'BIN!' and binary_format == 77
+
+UNIFORMS = [('model', OpenGL.GL.GL_FLOAT_MAT4), ('view', OpenGL.GL.GL_FLOAT_MAT4),
+            ('lightPos', OpenGL.GL.GL_FLOAT_VEC3), ('alpha', OpenGL.GL.GL_FLOAT),
+            ('useTexture', OpenGL.GL.GL_INT), ('texture1', OpenGL.GL.GL_SAMPLER_2D),
+            ('lights[0]', OpenGL.GL.GL_FLOAT_VEC3)]
+
+class ShaderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def create(self, **kwargs):
+        gl = FakeGL(UNIFORMS, **kwargs)
+        return Shader(VERTEX_PATH, FRAGMENT_PATH, gl=gl, cache_dir=self.cache_dir), gl
+
+class UniformTest(ShaderTestCase):
+    def test_locations_found_once(self):
+        program, gl = self.create()
+        self.assertEqual(program.location('model'), 0)
+        self.assertEqual(program.location('lights'), program.location('lights[0]'))
+        gl.calls.clear()
+        program.set_int('useTexture', 1)
+        program.set_mat4('model', np.eye(4))
+        self.assertNotIn('glGetUniformLocation', gl.names())
+
+    def test_unknown_uniform_looked_up_once(self):
+        program, gl = self.create()
+        gl.calls.clear()
+        program.set_int('missing', 1)
+        program.set_int('missing', 2)
+        self.assertEqual(gl.names(), ['glGetUniformLocation'])
+
+    def test_unchanged_values_skipped(self):
+        program, gl = self.create()
+        gl.calls.clear()
+        for _ in range(3):
+            program.set_int('useTexture', 1)
+            program.set_mat4('model', np.eye(4))
+        self.assertEqual(gl.names(), ['glUniform1i', 'glUniformMatrix4fv'])
+        program.set_mat4('model', np.eye(4) * 2)
+        program.set_int('useTexture', 0)
+        self.assertEqual(gl.names()[2:], ['glUniformMatrix4fv', 'glUniform1i'])
+
+    def test_set_uniforms_uses_declared_types(self):
+        program, gl = self.create()
+        gl.calls.clear()
+        program.set_uniforms({'view': np.eye(4), 'lightPos': (1, 2, 3), 'alpha': 0.5, 'texture1': 0,
+                              'lights': np.zeros(3), 'missing': 1})
+        self.assertEqual([name for name in gl.names() if name.startswith('glUniform')],
+                         ['glUniformMatrix4fv', 'glUniform3fv', 'glUniform1f', 'glUniform1i', 'glUniform3fv'])
+
+class ProgramCacheTest(ShaderTestCase):
+    def test_cache_key(self):
+        key = program_cache_key('vertex', 'fragment', 'driver')
+        self.assertEqual(key, program_cache_key('vertex', 'fragment', 'driver'))
+        self.assertNotEqual(key, program_cache_key('vertex', 'fragment', 'other driver'))
+        self.assertNotEqual(key, program_cache_key('vertexf', 'ragment', 'driver'))
+
+    def test_binary_reused(self):
+        first, gl = self.create()
+        self.assertFalse(first.from_cache)
+        self.assertIn('glCompileShader', gl.names())
+        second, gl = self.create()
+        self.assertTrue(second.from_cache)
+        self.assertNotIn('glCompileShader', gl.names())
+        self.assertGreaterEqual(second.startup_time, 0)
+
+    def test_other_driver_compiles(self):
+        self.create()
+        program, gl = self.create(renderer=b'Other')
+        self.assertFalse(program.from_cache)
+        self.assertNotIn('glProgramBinary', gl.names())
+
+    def test_rejected_binary_falls_back(self):
+        self.create()
+        program, gl = self.create(accept_binary=False)
+        self.assertFalse(program.from_cache)
+        self.assertIn('glProgramBinary', gl.names())
+        self.assertIn('glDeleteProgram', gl.names())
+        self.assertIn('glCompileShader', gl.names())
+        self.assertGreaterEqual(program.startup_time, 0)
+
+if __name__ == '__main__':
+    unittest.main()
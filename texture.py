@@ -0,0 +1,143 @@
+import numpy as np
+import pygame
+import mesh_cache
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Largest texture side kept after decoding (None keeps the full size)
+MAX_TEXTURE_SIZE = None
+
+# Version of the decoded pixels in the texture cache, raised when decoding changes
+TEXTURE_CACHE_VERSION = 2
+
+class Texture:
+    # Mip chain of (H,W,3) uint8 arrays, from full size down to 1x1 (built from pixels
+    # unless given)
+    def __init__(self, pixels, levels=None):
+        if levels is None:
+            levels = build_mipmaps(np.ascontiguousarray(pixels, dtype=np.uint8))
+        self.levels = levels
+
+    # Wrap a decoded mip chain without copying it, dropping any alpha channel
+    @classmethod
+    def from_levels(cls, levels):
+        return cls(None, [level[:, :, :3] for level in levels])
+
+    # The 1x1 level is the average color of the whole texture
+    def average_color(self):
+        return tuple(int(c) for c in self.levels[-1][0, 0])
+
+# Decode an image file to a (H,W,3) or, when it has transparency, (H,W,4) uint8 array, top
+# row first, shrunk so neither side exceeds max_size. Pixels are converted in bulk; other
+# modes (L, P, CMYK, 16-bit...) become RGB or RGBA
+def decode_image(path, max_size=MAX_TEXTURE_SIZE):
+    if Image is None:
+        return _decode_with_pygame(path, max_size)
+    with Image.open(path) as image:
+        alpha = image.mode in ('RGBA', 'LA', 'PA', 'RGBa', 'La') or 'transparency' in image.info
+        mode = 'RGBA' if alpha else 'RGB'
+        if max_size:
+            # JPEGs decode straight at a reduced scale
+            image.draft(mode, (max_size, max_size))
+        if image.mode.startswith('I'):
+            # 16- and 32-bit grayscale would be clamped by convert(); keep the high byte instead
+            image = Image.fromarray(np.clip(np.asarray(image) >> 8, 0, 255).astype(np.uint8), 'L')
+        if image.mode != mode:
+            image = image.convert(mode)
+        if max_size and max(image.size) > max_size:
+            image.thumbnail((max_size, max_size), Image.Resampling.BOX)
+        return np.asarray(image)
+
+# Fallback decoder when Pillow is not installed
+def _decode_with_pygame(path, max_size):
+    surface = pygame.image.load(path)
+    if max_size and max(surface.get_size()) > max_size:
+        scale = max_size / max(surface.get_size())
+        size = (max(1, int(surface.get_width() * scale)), max(1, int(surface.get_height() * scale)))
+        surface = pygame.transform.smoothscale(surface, size)
+    pixels = pygame.surfarray.array3d(surface)
+    if surface.get_flags() & pygame.SRCALPHA:
+        pixels = np.dstack((pixels, pygame.surfarray.array_alpha(surface)))
+    return np.ascontiguousarray(pixels.transpose(1, 0, 2))
+
+# Mip chain of an image file; decoded once, then stored raw in the mesh cache and
+# memory-mapped on later loads
+def load_texture_levels(path, max_size=MAX_TEXTURE_SIZE):
+    cached = mesh_cache.load_arrays(path, 'texture')
+    if cached is not None:
+        arrays, metadata = cached
+        if metadata.get('max_size') == max_size and metadata.get('version') == TEXTURE_CACHE_VERSION:
+            return [arrays[f'level{level}'] for level in range(metadata['levels'])]
+    levels = build_mipmaps(decode_image(path, max_size))
+    try:
+        mesh_cache.store_arrays(path, 'texture', {f'level{level}': pixels for level, pixels in enumerate(levels)},
+                                {'max_size': max_size, 'levels': len(levels), 'version': TEXTURE_CACHE_VERSION})
+    except OSError as e:
+        print(f"Could not cache texture '{path}': {e}")
+    return levels
+
+# Halve an image with a 2x2 box filter until it is 1x1
+def build_mipmaps(pixels):
+    levels = [pixels]
+    while pixels.shape[0] > 1 or pixels.shape[1] > 1:
+        pixels = pixels.astype(np.uint16)
+        for axis in (0, 1):
+            if pixels.shape[axis] > 1:
+                even = pixels.shape[axis] // 2 * 2
+                first = pixels.take(np.arange(0, even, 2), axis=axis)
+                second = pixels.take(np.arange(1, even, 2), axis=axis)
+                pixels = (first + second + 1) // 2
+        pixels = pixels.astype(np.uint8)
+        levels.append(pixels)
+    return levels
+
+class TextureSet:
+    # Every level of every texture, looked up by (texture id, level). The levels are the
+    # textures' own arrays, shared with the texture cache and every other model using them
+    def __init__(self, textures):
+        self.textures = list(textures)
+        self.level_count = max((len(texture.levels) for texture in self.textures), default=1)
+        shape = (max(len(self.textures), 1), self.level_count)
+        self.widths = np.ones(shape, dtype=np.int64)
+        self.heights = np.ones(shape, dtype=np.int64)
+        self.level_counts = np.ones(shape[0], dtype=np.int64)
+        self.pixels = [None] * (shape[0] * shape[1])
+        for texture_id, texture in enumerate(self.textures):
+            self.level_counts[texture_id] = len(texture.levels)
+            for level, pixels in enumerate(texture.levels):
+                self.pixels[texture_id * self.level_count + level] = pixels
+                self.heights[texture_id, level], self.widths[texture_id, level] = pixels.shape[:2]
+
+    def __len__(self):
+        return len(self.textures)
+
+    # Mip level that maps roughly one texel to one pixel, for triangles covering texel_area
+    # level-0 texels and pixel_area pixels
+    def select_levels(self, texture_ids, texel_area, pixel_area):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            levels = 0.5 * np.log2(texel_area / pixel_area)
+        levels = np.nan_to_num(levels, nan=0.0, posinf=0.0, neginf=0.0)
+        return np.clip(np.floor(levels), 0, self.level_counts[texture_ids] - 1).astype(np.int64)
+
+    # Nearest-texel lookup with repeat wrapping; v runs bottom to top as in OBJ files
+    def sample(self, texture_ids, levels, u, v):
+        widths = self.widths[texture_ids, levels]
+        heights = self.heights[texture_ids, levels]
+        u = u - np.floor(u)
+        v = 1 - (v - np.floor(v))
+        x = np.minimum((u * widths).astype(np.int64), widths - 1)
+        y = np.minimum((v * heights).astype(np.int64), heights - 1)
+        keys = texture_ids * self.level_count + levels
+        if len(keys) == 0:
+            return np.zeros((0, 3), dtype=np.uint8)
+        if (keys == keys[0]).all():
+            # Usually all the fragments come from the same level of one texture
+            return self.pixels[keys[0]][y, x]
+        colors = np.empty((len(keys), 3), dtype=np.uint8)
+        for key in np.unique(keys):
+            selected = keys == key
+            colors[selected] = self.pixels[key][y[selected], x[selected]]
+        return colors
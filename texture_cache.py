@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from texture import MAX_TEXTURE_SIZE, load_texture_levels
+
+# Memory that decoded textures no model is using may keep before the least recently used
+# are dropped, and the threads decoding them
+TEXTURE_CACHE_MB = float(os.environ.get('OBJ_VIEWER_TEXTURE_CACHE_MB', '512'))
+DECODE_WORKERS = min(4, os.cpu_count() or 1)
+
+class TextureCache:
+    # Decoded mip chains shared by every material and model using the same image file. Each
+    # request() starts a decode on the thread pool unless one is cached, and holds a reference
+    # until release(); unreferenced textures stay cached within memory_budget bytes
+    def __init__(self, memory_budget=TEXTURE_CACHE_MB * 1024 * 1024, workers=DECODE_WORKERS):
+        self.memory_budget = memory_budget
+        self.workers = workers
+        self.executor = None
+        # Reentrant, since a decode that already finished calls back from inside request()
+        self.lock = threading.RLock()
+        self.entries = OrderedDict()
+
+    # Files are identified by resolved path and modification time, so an edited image is decoded again
+    @staticmethod
+    def key(path, max_size=MAX_TEXTURE_SIZE):
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size, max_size)
+
+    # Reference a texture, starting its decode if needed; returns the key to pass to the
+    # other methods (raises OSError when the file is missing)
+    def request(self, path, max_size=MAX_TEXTURE_SIZE):
+        key = self.key(path, max_size)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='texture')
+                # Referenced before the decode starts, so a decode that finishes at once isn't trimmed
+                entry = {"future": None, "refs": 1, "nbytes": 0}
+                self.entries[key] = entry
+                entry["future"] = self.executor.submit(load_texture_levels, key[0], max_size)
+                entry["future"].add_done_callback(lambda future: self._decoded(key, future))
+            else:
+                entry["refs"] += 1
+                self.entries.move_to_end(key)
+        return key
+
+    # Whether the texture has finished decoding (successfully or not)
+    def ready(self, key):
+        return self.entries[key]["future"].done()
+
+    # The texture's mip chain, waiting for the decode; raises the decoding error if it failed
+    def levels(self, key):
+        return self.entries[key]["future"].result()
+
+    # Drop a reference taken by request()
+    def release(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["refs"] == 0:
+                return
+            entry["refs"] -= 1
+            self._trim()
+
+    # Bytes held by decoded textures, counted against memory_budget
+    def nbytes(self):
+        with self.lock:
+            return sum(entry["nbytes"] for entry in self.entries.values())
+
+    def _decoded(self, key, future):
+        with self.lock:
+            entry = self.entries.get(key)
+            # The entry may have been dropped (and requested again) since this decode started
+            if entry is None or entry["future"] is not future:
+                return
+            if future.exception() is None:
+                entry["nbytes"] = sum(level.nbytes for level in future.result())
+            self._trim()
+
+    # Forget failed decodes nobody holds, then unreferenced textures, least recently requested
+    # first, while over budget (called with the lock held)
+    def _trim(self):
+        total = self.nbytes()
+        for key, entry in list(self.entries.items()):
+            if entry["refs"] or not entry["future"].done():
+                continue
+            if entry["future"].exception() is not None or total > self.memory_budget:
+                total -= entry["nbytes"]
+                del self.entries[key]
+
+# The cache shared by every loader in the process
+shared_textures = TextureCache()